@@ -18,224 +18,254 @@ import sqlite3
 from dotenv import load_dotenv
 
 
-def check1_nav_out_of_range(src_conn):
-    """检测1：单位净值或累计单位净值 > 5"""
-    cursor = src_conn.cursor()
+def check1_nav_out_of_range(cursor):
+    """检测1：单位净值或累计单位净值 > 5
+
+    WHERE 条件须与 get_163_email.py 中部分索引 idx_nav_out_of_range 的条件保持一致，
+    SQLite 才会使用该索引（累计单位净值为 NULL 时比较结果为 NULL，等价于不满足）。
+    """
     cursor.execute('''
         SELECT f.fund_id, f.id, f.产品名称, f.产品代码, f.净值日期, f.单位净值, f.累计单位净值,
                e.邮件主题, e.邮件发件人, e.邮件日期, e.附件文件名, e.sheet名称
         FROM fund_nav_data f
         LEFT JOIN email_sources e ON f.source_id = e.id
-        WHERE f.单位净值 > 5 OR (f.累计单位净值 IS NOT NULL AND f.累计单位净值 > 5)
+        WHERE f.单位净值 > 5 OR f.累计单位净值 > 5
         ORDER BY f.fund_id
     ''')
     return cursor.fetchall()
 
 
-def check2_same_name_multi_code(src_conn):
-    """检测2：相同产品名称对应多个产品代码"""
-    cursor = src_conn.cursor()
+def check2_same_name_multi_code(cursor):
+    """检测2：相同产品名称对应多个产品代码
+
+    按 (产品名称, 产品代码) 只聚合一次（可走覆盖索引 idx_name_code），用窗口函数得到每个名称的代码数，
+    同一查询中再追溯冲突名称的来源；冲突列表直接由来源记录汇总，不再单独执行一次 GROUP BY。
+    """
+    # 每个 (产品名称, 产品代码) 按首次插入顺序最多取 3 条不同来源
     cursor.execute('''
-        SELECT 产品名称, GROUP_CONCAT(DISTINCT 产品代码), COUNT(DISTINCT 产品代码)
-        FROM fund_nav_data
-        WHERE 产品名称 IS NOT NULL
-        GROUP BY 产品名称
-        HAVING COUNT(DISTINCT 产品代码) > 1
+        WITH name_codes AS (
+            SELECT 产品名称, 产品代码, COUNT(*) OVER (PARTITION BY 产品名称) AS code_count
+            FROM fund_nav_data
+            WHERE 产品名称 IS NOT NULL
+            GROUP BY 产品名称, 产品代码
+        ),
+        sources AS (
+            SELECT f.产品名称, f.产品代码, c.code_count, f.fund_id,
+                   e.邮件主题, e.邮件发件人, e.邮件日期, e.附件文件名,
+                   ROW_NUMBER() OVER (PARTITION BY f.产品名称, f.产品代码 ORDER BY MIN(f.id)) AS rn
+            FROM name_codes c
+            JOIN fund_nav_data f ON f.产品名称 = c.产品名称 AND f.产品代码 = c.产品代码
+            LEFT JOIN email_sources e ON f.source_id = e.id
+            WHERE c.code_count > 1
+            GROUP BY f.产品名称, f.产品代码, c.code_count, f.fund_id,
+                     e.邮件主题, e.邮件发件人, e.邮件日期, e.附件文件名
+        )
+        SELECT 产品名称, 产品代码, code_count, fund_id, 邮件主题, 邮件发件人, 邮件日期, 附件文件名
+        FROM sources
+        WHERE rn <= 3
+        ORDER BY 产品名称, 产品代码, rn
     ''')
-    conflicts = cursor.fetchall()
 
-    # 为每个冲突产品名称追溯来源
+    # 按产品名称汇总冲突代码及其来源（行已按名称、代码排序）
     details = []
-    for product_name, codes_str, code_count in conflicts:
-        codes = codes_str.split(',')
-        sources = []
-        for code in codes:
-            cursor.execute('''
-                SELECT DISTINCT f.fund_id, e.邮件主题, e.邮件发件人, e.邮件日期, e.附件文件名
-                FROM fund_nav_data f
-                LEFT JOIN email_sources e ON f.source_id = e.id
-                WHERE f.产品名称 = ? AND f.产品代码 = ?
-                LIMIT 3
-            ''', (product_name, code.strip()))
-            rows = cursor.fetchall()
-            fund_id = rows[0][0] if rows else None
-            emails = [(r[1], r[2], r[3], r[4]) for r in rows]
-            sources.append({'code': code.strip(), 'fund_id': fund_id, 'emails': emails})
-        details.append({
-            'product_name': product_name,
-            'codes': codes,
-            'code_count': code_count,
-            'sources': sources
-        })
+    for product_name, code, code_count, fund_id, subj, sender, edate, fname in cursor.fetchall():
+        if not details or details[-1]['product_name'] != product_name:
+            details.append({
+                'product_name': product_name,
+                'codes': [],
+                'code_count': code_count,
+                'sources': []
+            })
+        item = details[-1]
+        if not item['codes'] or item['codes'][-1] != code:
+            item['codes'].append(code)
+            item['sources'].append({'code': code, 'fund_id': fund_id, 'emails': []})
+        item['sources'][-1]['emails'].append((subj, sender, edate, fname))
     return details
 
 
-def check3_duplicate_nav_dates(src_conn):
-    """检测3：重复净值日期（同产品代码同日期多条记录）"""
-    cursor = src_conn.cursor()
+def check3_duplicate_nav_dates(cursor):
+    """检测3：重复净值日期（同产品代码同日期多条记录）
+
+    先只用 (产品代码, 净值日期) 唯一索引找出重复分组（覆盖索引扫描，不回表），
+    再仅对这些分组回表取 fund_id 和产品名称。
+    """
     cursor.execute('''
-        SELECT n.fund_id, MIN(n.产品名称), n.产品代码, n.净值日期, COUNT(*) as cnt
-        FROM fund_nav_data n
-        GROUP BY n.产品代码, n.净值日期
-        HAVING COUNT(*) > 1
-        ORDER BY n.fund_id
+        WITH dup AS (
+            SELECT 产品代码, 净值日期, COUNT(*) AS cnt
+            FROM fund_nav_data
+            GROUP BY 产品代码, 净值日期
+            HAVING COUNT(*) > 1
+        )
+        SELECT n.fund_id, MIN(n.产品名称), d.产品代码, d.净值日期, d.cnt
+        FROM dup d
+        JOIN fund_nav_data n ON n.产品代码 = d.产品代码 AND n.净值日期 = d.净值日期
+        GROUP BY d.产品代码, d.净值日期
+        ORDER BY n.fund_id, d.产品代码, d.净值日期
     ''')
     return cursor.fetchall()
 
 
-def build_clean_db(src_conn, clean_db_path):
-    """构建 fund_clean.db：排除异常记录，反范式化来源信息，同步 funds 表"""
-    cursor = src_conn.cursor()
+def build_clean_db(cursor, clean_db_path, has_funds):
+    """构建 fund_clean.db：排除异常记录，反范式化来源信息，同步 funds 表
 
+    校准库通过 ATTACH 挂载到源库连接上，数据用 INSERT ... SELECT 在 SQLite 内部直接复制，
+    不再把所有记录读入 Python 再逐行写回。has_funds 表示源库是否存在 funds 表（用于同步到 clean DB）。
+    """
     # 统计源数据总数
     cursor.execute('SELECT COUNT(*) FROM fund_nav_data')
     total_src = cursor.fetchone()[0]
 
-    # 读取 funds 表（用于同步到 clean DB）
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='funds'")
-    has_funds = cursor.fetchone() is not None
-    if has_funds:
-        cursor.execute('SELECT fund_id, 产品代码, 产品名称, 首次录入时间 FROM funds ORDER BY fund_id')
-        funds_rows = cursor.fetchall()
-    else:
-        funds_rows = []
-
-    # 查询需要写入的干净数据（含 fund_id）
-    cursor.execute('''
-        SELECT f.fund_id, f.产品名称, f.产品代码, f.净值日期, f.单位净值, f.累计单位净值,
-               e.邮件主题, e.邮件发件人, e.邮件日期, e.附件文件名, e.sheet名称, f.source_id
-        FROM fund_nav_data f
-        LEFT JOIN email_sources e ON f.source_id = e.id
-        WHERE f.单位净值 <= 5
-          AND (f.累计单位净值 IS NULL OR f.累计单位净值 <= 5)
-          AND f.id = (SELECT MIN(f2.id) FROM fund_nav_data f2
-                      WHERE f2.产品代码 = f.产品代码 AND f2.净值日期 = f.净值日期)
-        ORDER BY f.fund_id, f.净值日期
-    ''')
-    clean_rows = cursor.fetchall()
-
     # 删除旧的 clean DB，重建
     if os.path.exists(clean_db_path):
         os.remove(clean_db_path)
 
-    clean_conn = sqlite3.connect(clean_db_path)
-    clean_cursor = clean_conn.cursor()
-
-    # 创建 funds 表（与源库保持同步）
-    clean_cursor.execute('''
-        CREATE TABLE IF NOT EXISTS funds (
-            fund_id INTEGER PRIMARY KEY,
-            产品代码 TEXT NOT NULL UNIQUE,
-            产品名称 TEXT,
-            首次录入时间 DATETIME
-        )
-    ''')
-    if funds_rows:
-        clean_cursor.executemany(
-            'INSERT OR IGNORE INTO funds (fund_id, 产品代码, 产品名称, 首次录入时间) VALUES (?, ?, ?, ?)',
-            funds_rows
-        )
-
-    # 创建净值数据表（含 fund_id）
-    clean_cursor.execute('''
-        CREATE TABLE IF NOT EXISTS fund_nav_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            fund_id INTEGER REFERENCES funds(fund_id),
-            产品名称 TEXT,
-            产品代码 TEXT NOT NULL,
-            净值日期 TEXT NOT NULL,
-            单位净值 REAL NOT NULL,
-            累计单位净值 REAL,
-            插入时间 DATETIME DEFAULT CURRENT_TIMESTAMP,
-            source_id INTEGER,
-            来源邮件主题 TEXT,
-            来源发件人 TEXT,
-            来源邮件日期 TEXT,
-            来源附件文件名 TEXT,
-            来源sheet名称 TEXT,
-            UNIQUE(产品代码, 净值日期)
-        )
-    ''')
-
-    clean_cursor.executemany('''
-        INSERT OR IGNORE INTO fund_nav_data
-        (fund_id, 产品名称, 产品代码, 净值日期, 单位净值, 累计单位净值,
-         来源邮件主题, 来源发件人, 来源邮件日期, 来源附件文件名, 来源sheet名称, source_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', clean_rows)
-    clean_conn.commit()
-    clean_conn.close()
+    cursor.execute('ATTACH DATABASE ? AS clean', (clean_db_path,))
+    cursor.execute('PRAGMA clean.synchronous=NORMAL')
+
+    # 建表与写入放在同一个事务中，整个校准库只提交一次
+    with cursor.connection:
+        cursor.execute('BEGIN')
+
+        # 创建 funds 表（与源库保持同步）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS clean.funds (
+                fund_id INTEGER PRIMARY KEY,
+                产品代码 TEXT NOT NULL UNIQUE,
+                产品名称 TEXT,
+                首次录入时间 DATETIME
+            )
+        ''')
+        if has_funds:
+            cursor.execute('''
+                INSERT OR IGNORE INTO clean.funds (fund_id, 产品代码, 产品名称, 首次录入时间)
+                SELECT fund_id, 产品代码, 产品名称, 首次录入时间 FROM main.funds ORDER BY fund_id
+            ''')
+
+        # 创建净值数据表（含 fund_id）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS clean.fund_nav_data (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fund_id INTEGER REFERENCES funds(fund_id),
+                产品名称 TEXT,
+                产品代码 TEXT NOT NULL,
+                净值日期 TEXT NOT NULL,
+                单位净值 REAL NOT NULL,
+                累计单位净值 REAL,
+                插入时间 DATETIME DEFAULT CURRENT_TIMESTAMP,
+                source_id INTEGER,
+                来源邮件主题 TEXT,
+                来源发件人 TEXT,
+                来源邮件日期 TEXT,
+                来源附件文件名 TEXT,
+                来源sheet名称 TEXT,
+                UNIQUE(产品代码, 净值日期)
+            )
+        ''')
+
+        # 写入干净数据（含 fund_id）
+        # 重复记录只保留最早插入的一条：先按 (产品代码, 净值日期) 分组一次求 MIN(id)，
+        # 再与主表连接，避免对每一行执行一次相关子查询
+        cursor.execute('''
+            WITH dedup AS (
+                SELECT MIN(id) AS min_id
+                FROM main.fund_nav_data
+                GROUP BY 产品代码, 净值日期
+            )
+            INSERT OR IGNORE INTO clean.fund_nav_data
+            (fund_id, 产品名称, 产品代码, 净值日期, 单位净值, 累计单位净值,
+             来源邮件主题, 来源发件人, 来源邮件日期, 来源附件文件名, 来源sheet名称, source_id)
+            SELECT f.fund_id, f.产品名称, f.产品代码, f.净值日期, f.单位净值, f.累计单位净值,
+                   e.邮件主题, e.邮件发件人, e.邮件日期, e.附件文件名, e.sheet名称, f.source_id
+            FROM dedup d
+            JOIN main.fund_nav_data f ON f.id = d.min_id
+            LEFT JOIN main.email_sources e ON f.source_id = e.id
+            WHERE f.单位净值 <= 5
+              AND (f.累计单位净值 IS NULL OR f.累计单位净值 <= 5)
+            ORDER BY f.fund_id, f.净值日期
+        ''')
+
+        # 以 WITH 开头的语句不会设置 cursor.rowcount，改用 changes() 获取写入条数
+        cursor.execute('SELECT changes()')
+        written = cursor.fetchone()[0]
+
+    cursor.execute('DETACH DATABASE clean')
 
-    written = len(clean_rows)
     excluded = total_src - written
     return total_src, written, excluded
 
 
 def print_report(check1_rows, check2_details, check3_rows, total_src, written, excluded, clean_db_path):
-    """打印检测报告"""
-    print()
-    print("=" * 70)
-    print("数据质量检测报告")
-    print("=" * 70)
+    """打印检测报告
+
+    异常记录可能有成千上万条，报告先逐行收集到列表，最后一次性输出，避免大量零散的 print 调用。
+    """
+    lines = []
+    lines.append('')
+    lines.append("=" * 70)
+    lines.append("数据质量检测报告")
+    lines.append("=" * 70)
 
     # 检测1
-    print()
-    print("【检测1】单位净值 / 累计单位净值 > 5")
+    lines.append('')
+    lines.append("【检测1】单位净值 / 累计单位净值 > 5")
     if check1_rows:
-        print(f"  发现 {len(check1_rows)} 条异常记录：")
+        lines.append(f"  发现 {len(check1_rows)} 条异常记录：")
         for row in check1_rows:
             fund_id, rid, name, code, date, nav, accum_nav, subj, sender, edate, fname, sheet = row
             fid_str = f"[{fund_id:03d}] " if fund_id is not None else ""
-            print(f"  {fid_str}ID={rid} | {code} - {name or '未知'} | {date}")
-            print(f"    单位净值={nav}  累计单位净值={accum_nav}")
+            lines.append(f"  {fid_str}ID={rid} | {code} - {name or '未知'} | {date}")
+            lines.append(f"    单位净值={nav}  累计单位净值={accum_nav}")
             if subj or fname:
-                print(f"    来源邮件: {subj or '无'} | 发件人: {sender or '无'} | 附件: {fname or '无'}")
+                lines.append(f"    来源邮件: {subj or '无'} | 发件人: {sender or '无'} | 附件: {fname or '无'}")
     else:
-        print("  未发现异常")
+        lines.append("  未发现异常")
 
     # 检测2
-    print()
-    print("【检测2】相同产品名称对应多个产品代码")
+    lines.append('')
+    lines.append("【检测2】相同产品名称对应多个产品代码")
     if check2_details:
-        print(f"  发现 {len(check2_details)} 个产品名称存在代码不一致：")
+        lines.append(f"  发现 {len(check2_details)} 个产品名称存在代码不一致：")
         for item in check2_details:
-            print(f"  产品名称: {item['product_name']}")
-            print(f"  对应代码: {', '.join(item['codes'])}（共{item['code_count']}个）")
-            print("  来源追溯:")
+            lines.append(f"  产品名称: {item['product_name']}")
+            lines.append(f"  对应代码: {', '.join(item['codes'])}（共{item['code_count']}个）")
+            lines.append("  来源追溯:")
             for src in item['sources']:
                 fund_id = src.get('fund_id')
                 fid_str = f"[{fund_id:03d}] " if fund_id is not None else ""
-                print(f"    {fid_str}代码 {src['code']}:")
+                lines.append(f"    {fid_str}代码 {src['code']}:")
                 if src['emails']:
                     for e in src['emails']:
                         subj, sender, edate, fname = e
-                        print(f"      邮件: {subj or '无'} | 发件人: {sender or '无'} | 附件: {fname or '无'}")
+                        lines.append(f"      邮件: {subj or '无'} | 发件人: {sender or '无'} | 附件: {fname or '无'}")
                 else:
-                    print("      （来源邮件信息不可用，可能是旧数据）")
+                    lines.append("      （来源邮件信息不可用，可能是旧数据）")
     else:
-        print("  未发现异常")
+        lines.append("  未发现异常")
 
     # 检测3
-    print()
-    print("【检测3】重复净值日期")
+    lines.append('')
+    lines.append("【检测3】重复净值日期")
     if check3_rows:
-        print(f"  发现 {len(check3_rows)} 条重复净值日期：")
+        lines.append(f"  发现 {len(check3_rows)} 条重复净值日期：")
         for row in check3_rows:
             fund_id, name, code, date, cnt = row
             fid_str = f"[{fund_id:03d}] " if fund_id is not None else ""
-            print(f"  {fid_str}{code} - {name or '未知'} | {date} | 重复 {cnt} 次")
+            lines.append(f"  {fid_str}{code} - {name or '未知'} | {date} | 重复 {cnt} 次")
     else:
-        print("  未发现异常")
+        lines.append("  未发现异常")
 
     # 构建结果
-    print()
-    print("构建校准数据库")
-    print(f"  源数据库总记录数: {total_src}")
-    print(f"  写入校准数据库: {written} 条")
-    print(f"  排除异常记录: {excluded} 条")
-    print(f"  校准数据库已保存至: {clean_db_path}")
-    print()
-    print("=" * 70)
+    lines.append('')
+    lines.append("构建校准数据库")
+    lines.append(f"  源数据库总记录数: {total_src}")
+    lines.append(f"  写入校准数据库: {written} 条")
+    lines.append(f"  排除异常记录: {excluded} 条")
+    lines.append(f"  校准数据库已保存至: {clean_db_path}")
+    lines.append('')
+    lines.append("=" * 70)
+
+    print('\n'.join(lines))
 
 
 def main():
@@ -249,14 +279,20 @@ def main():
         return
 
     src_conn = sqlite3.connect(db_path)
+    # 批量读写调优：NORMAL 同步级别，临时 B 树放内存，页缓存 64MB；
+    # 只设置仅对本连接生效的参数，journal_mode 会持久写入源库，交由 get_163_email.py 管理
+    src_conn.execute('PRAGMA synchronous=NORMAL')
+    src_conn.execute('PRAGMA temp_store=MEMORY')
+    src_conn.execute('PRAGMA cache_size=-65536')
 
-    # 检查辅助表是否存在（兼容旧库）
+    # 所有检测与校准库构建共用同一个游标
     cursor = src_conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='email_sources'")
-    has_sources_table = cursor.fetchone() is not None
 
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='funds'")
-    has_funds_table = cursor.fetchone() is not None
+    # 检查辅助表是否存在（兼容旧库）
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name IN ('email_sources', 'funds')")
+    existing_tables = {row[0] for row in cursor.fetchall()}
+    has_sources_table = 'email_sources' in existing_tables
+    has_funds_table = 'funds' in existing_tables
 
     if not has_sources_table:
         print("警告：源数据库中不存在 email_sources 表，来源信息将为空。")
@@ -266,10 +302,10 @@ def main():
         print("警告：源数据库中不存在 funds 表，fund_id 信息将为空。")
         print("请先运行 get_163_email.py 以建立该表。")
 
-    check1_rows = check1_nav_out_of_range(src_conn)
-    check2_details = check2_same_name_multi_code(src_conn)
-    check3_rows = check3_duplicate_nav_dates(src_conn)
-    total_src, written, excluded = build_clean_db(src_conn, clean_db_path)
+    check1_rows = check1_nav_out_of_range(cursor)
+    check2_details = check2_same_name_multi_code(cursor)
+    check3_rows = check3_duplicate_nav_dates(cursor)
+    total_src, written, excluded = build_clean_db(cursor, clean_db_path, has_funds_table)
 
     src_conn.close()
 
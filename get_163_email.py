@@ -13,27 +13,84 @@
    - 单位净值
    - 累计单位净值
 3. 将数据存储到SQLite数据库
-4. 自动去重（基于产品代码和净值日期）
+4. 自动去重（基于产品代码和净值日期），重复记录仅补全缺失的累计单位净值
 5. 将无法识别/提取失败的邮件附件信息持久化到 extraction_failures 表
 6. 按产品代码分类、按净值日期排序展示数据
 """
 
 import os
+import re
+import base64
+import binascii
+import hashlib
+import tempfile
 import imaplib
 import email
 from email.header import decode_header
 import sys
 import sqlite3
+import queue
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import pandas as pd
 from datetime import datetime
-from io import BytesIO
 from dotenv import load_dotenv
 from smart_extractor import extract_and_normalize
 
+# python-calamine 为可选依赖：启动时检测一次，未安装时直接使用默认引擎，
+# 不必为每个附件都先尝试 calamine 再捕获异常
+try:
+    import python_calamine  # noqa: F401
+    HAS_CALAMINE = True
+except ImportError:
+    HAS_CALAMINE = False
+
+# 数据库连接的预编译语句缓存大小（sqlite3 默认 128）
+SQL_CACHED_STATEMENTS = 512
+
+# 高频执行的 SQL 语句，集中定义为模块级常量，便于命中连接上的预编译语句缓存
+SQL_SELECT_FUND_ID = 'SELECT fund_id FROM funds WHERE 产品代码 = ?'
+
+SQL_INSERT_FUND = 'INSERT INTO funds (产品代码, 产品名称) VALUES (?, ?)'
+
+SQL_INSERT_SOURCE = '''
+    INSERT INTO email_sources (邮件主题, 邮件发件人, 邮件日期, 附件文件名, sheet名称)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+# (产品代码, 净值日期) 已存在时用 UPSERT 原地补全缺失的累计单位净值，其余情况保持原记录不变；
+# OR IGNORE 仍用于跳过违反 NOT NULL 约束的行（如单位净值为 NaN）
+SQL_INSERT_NAV = '''
+    INSERT OR IGNORE INTO fund_nav_data
+    (fund_id, 产品名称, 产品代码, 净值日期, 单位净值, 累计单位净值, source_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(产品代码, 净值日期) DO UPDATE SET 累计单位净值 = excluded.累计单位净值
+    WHERE fund_nav_data.累计单位净值 IS NULL AND excluded.累计单位净值 IS NOT NULL
+'''
+
+SQL_LOG_FAIL = '''
+    INSERT INTO extraction_failures
+    (邮件主题, 邮件发件人, 邮件日期, 附件文件名, sheet名称, 失败原因)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+SQL_UPSERT_STATE = 'INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)'
+SQL_DELETE_STATE = 'DELETE FROM sync_state WHERE key = ?'
+
 
 def init_database(db_path):
     """初始化 SQLite 数据库，创建所有必要的表"""
-    conn = sqlite3.connect(db_path)
+    conn = sqlite3.connect(db_path, cached_statements=SQL_CACHED_STATEMENTS)
+    # 批量写入调优：WAL 日志 + NORMAL 同步级别（提交时不再每次 fsync），
+    # 临时 B 树放内存，页缓存 64MB，内存映射 256MB
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-65536')
+    conn.execute('PRAGMA mmap_size=268435456')
     cursor = conn.cursor()
 
     # 邮件来源表（须在 fund_nav_data 之前创建，以便外键引用）
@@ -126,6 +183,19 @@ def init_database(db_path):
         ON fund_nav_data(fund_id)
     ''')
 
+    # 质检脚本按产品名称分组统计产品代码，(产品名称, 产品代码) 可作为覆盖索引
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_name_code
+        ON fund_nav_data(产品名称, 产品代码)
+    ''')
+
+    # 部分索引：只收录净值超范围（> 5）的异常记录，质检脚本检测1 直接走索引而无需全表扫描
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_nav_out_of_range
+        ON fund_nav_data(fund_id)
+        WHERE 单位净值 > 5 OR 累计单位净值 > 5
+    ''')
+
     # 增量同步状态表：记录上次处理到的最大UID和UIDVALIDITY
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS sync_state (
@@ -134,6 +204,14 @@ def init_database(db_path):
         )
     ''')
 
+    # 迁移：旧版本把含空单元格的数值列按浮点数读入，产品代码/净值日期以 '123456.0'、'20240130.0'
+    # 形式入库；现在按原始单元格值读取并去掉 '.0' 后缀，已有记录统一改写为新格式（只执行一次）
+    cursor.execute("SELECT value FROM sync_state WHERE key = 'key_format'")
+    if cursor.fetchone() is None:
+        migrate_float_keys(conn)
+        cursor.execute(SQL_UPSERT_STATE, ('key_format', '1'))
+        conn.commit()
+
     # 提取/识别失败记录表：持久化所有无法处理的邮件附件信息
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS extraction_failures (
@@ -153,79 +231,158 @@ def init_database(db_path):
     return conn
 
 
+_FLOAT_KEY_RE = re.compile(r'(\d+)\.0', re.ASCII)
+
+
+def normalize_key(value):
+    """去掉按浮点数读入的整数键的 '.0' 后缀（'123456.0' -> '123456'），其他值原样返回"""
+    if isinstance(value, str):
+        match = _FLOAT_KEY_RE.fullmatch(value)
+        if match:
+            return match.group(1)
+    return value
+
+
+def migrate_float_keys(conn):
+    """将已有记录中带 '.0' 后缀的产品代码/净值日期改写为新格式
+
+    改写后与已有记录的键冲突时视为同一条数据：保留较早的记录（id/fund_id 较小者），
+    并用被合并记录补全其累计单位净值。
+    """
+    cursor = conn.cursor()
+
+    # 基金主表：代码冲突时把净值记录并入较早的 fund_id
+    cursor.execute("SELECT fund_id, 产品代码 FROM funds WHERE 产品代码 GLOB '*.0'")
+    for fund_id, product_code in cursor.fetchall():
+        new_code = normalize_key(product_code)
+        if new_code == product_code:
+            continue
+        cursor.execute(SQL_SELECT_FUND_ID, (new_code,))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute('UPDATE funds SET 产品代码 = ? WHERE fund_id = ?', (new_code, fund_id))
+            continue
+        keep_id, drop_id = min(row[0], fund_id), max(row[0], fund_id)
+        cursor.execute('UPDATE fund_nav_data SET fund_id = ? WHERE fund_id = ?', (keep_id, drop_id))
+        cursor.execute('DELETE FROM funds WHERE fund_id = ?', (drop_id,))
+        cursor.execute('UPDATE funds SET 产品代码 = ? WHERE fund_id = ?', (new_code, keep_id))
+
+    # 净值表：(产品代码, 净值日期) 冲突时保留较早的记录
+    cursor.execute('''
+        SELECT id, 产品代码, 净值日期, 累计单位净值 FROM fund_nav_data
+        WHERE 产品代码 GLOB '*.0' OR 净值日期 GLOB '*.0'
+        ORDER BY id
+    ''')
+    for row_id, product_code, nav_date, accum_nav in cursor.fetchall():
+        new_code, new_date = normalize_key(product_code), normalize_key(nav_date)
+        if (new_code, new_date) == (product_code, nav_date):
+            continue
+        cursor.execute(
+            'SELECT id FROM fund_nav_data WHERE 产品代码 = ? AND 净值日期 = ?', (new_code, new_date))
+        row = cursor.fetchone()
+        keep_id = row_id
+        if row is not None:
+            keep_id = min(row[0], row_id)
+            drop_id = max(row[0], row_id)
+            if drop_id == row_id:
+                fill_accum_nav = accum_nav
+            else:
+                cursor.execute('SELECT 累计单位净值 FROM fund_nav_data WHERE id = ?', (drop_id,))
+                fill_accum_nav = cursor.fetchone()[0]
+            cursor.execute('DELETE FROM fund_nav_data WHERE id = ?', (drop_id,))
+            cursor.execute(
+                'UPDATE fund_nav_data SET 累计单位净值 = COALESCE(累计单位净值, ?) WHERE id = ?',
+                (fill_accum_nav, keep_id))
+        cursor.execute('''
+            UPDATE fund_nav_data
+            SET 产品代码 = ?, 净值日期 = ?,
+                fund_id = COALESCE((SELECT fund_id FROM funds WHERE 产品代码 = ?), fund_id)
+            WHERE id = ?
+        ''', (new_code, new_date, new_code, keep_id))
+
+
 def get_sync_state(conn):
-    """读取上次同步状态，返回 (last_uid, uidvalidity)"""
+    """读取上次同步状态，返回 (last_uid, uidvalidity, highestmodseq)
+
+    highestmodseq 为上次完整同步结束时服务器的 HIGHESTMODSEQ（服务器不支持 CONDSTORE 时为 None）。
+    """
     cursor = conn.cursor()
-    cursor.execute("SELECT value FROM sync_state WHERE key = 'last_uid'")
-    row = cursor.fetchone()
-    last_uid = int(row[0]) if row else 0
+    cursor.execute("SELECT key, value FROM sync_state WHERE key IN ('last_uid', 'uidvalidity', 'highestmodseq')")
+    state = dict(cursor.fetchall())
 
-    cursor.execute("SELECT value FROM sync_state WHERE key = 'uidvalidity'")
-    row = cursor.fetchone()
-    uidvalidity = row[0] if row else None
+    last_uid = int(state['last_uid']) if 'last_uid' in state else 0
+    return last_uid, state.get('uidvalidity'), state.get('highestmodseq')
 
-    return last_uid, uidvalidity
 
+def save_sync_state(conn, last_uid, uidvalidity, highestmodseq=None, clear_highestmodseq=False):
+    """保存同步状态，并提交当前事务（与同批次写入的数据一起落盘）
 
-def save_sync_state(conn, last_uid, uidvalidity):
-    """保存同步状态"""
+    highestmodseq 只在整个邮箱都已同步完毕时传入；批次中途保存位点时保持原值不变。
+    clear_highestmodseq=True 时删除已保存的 HIGHESTMODSEQ（本次有邮件未能处理），
+    下次同步时不会因邮箱未变化而跳过 UID SEARCH，从而重试这些邮件。
+    """
     cursor = conn.cursor()
-    cursor.execute(
-        "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
-        ('last_uid', str(last_uid))
-    )
-    cursor.execute(
-        "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
+    state = [
+        ('last_uid', str(last_uid)),
         ('uidvalidity', str(uidvalidity))
-    )
+    ]
+    if highestmodseq is not None:
+        state.append(('highestmodseq', str(highestmodseq)))
+    elif clear_highestmodseq:
+        cursor.execute(SQL_DELETE_STATE, ('highestmodseq',))
+    cursor.executemany(SQL_UPSERT_STATE, state)
     conn.commit()
 
 
 def get_or_create_fund_id(conn, product_code, product_name=None):
-    """获取或创建基金的 fund_id（基于产品代码全局唯一，按首次录入时间自增）"""
+    """获取或创建基金的 fund_id（基于产品代码全局唯一，按首次录入时间自增）
+
+    不单独提交，随调用方的批量事务一起提交。
+    """
     cursor = conn.cursor()
-    cursor.execute('SELECT fund_id FROM funds WHERE 产品代码 = ?', (product_code,))
+    cursor.execute(SQL_SELECT_FUND_ID, (product_code,))
     row = cursor.fetchone()
     if row:
         return row[0]
-    cursor.execute(
-        'INSERT INTO funds (产品代码, 产品名称) VALUES (?, ?)',
-        (product_code, product_name)
-    )
-    conn.commit()
+    cursor.execute(SQL_INSERT_FUND, (product_code, product_name))
     return cursor.lastrowid
 
 
 def insert_email_source(conn, email_subject, email_sender, email_date, filename, sheet_name):
-    """插入邮件来源记录，返回 source_id"""
+    """插入邮件来源记录，返回 source_id（不单独提交，随调用方的批量事务一起提交）"""
     cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO email_sources (邮件主题, 邮件发件人, 邮件日期, 附件文件名, sheet名称)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (email_subject, email_sender, email_date, filename, sheet_name))
-    conn.commit()
+    cursor.execute(SQL_INSERT_SOURCE, (email_subject, email_sender, email_date, filename, sheet_name))
     return cursor.lastrowid
 
 
-def log_extraction_failure(conn, email_subject, email_sender, email_date,
-                           filename, sheet_name, reason):
-    """将提取或识别失败的附件信息写入 extraction_failures 表"""
+def log_extraction_failures(conn, pending_failures):
+    """将缓冲的提取或识别失败记录批量写入 extraction_failures 表，写入后清空缓冲区
+
+    每条记录为 (邮件主题, 邮件发件人, 邮件日期, 附件文件名, sheet名称, 失败原因)，
+    随调用方的批量事务一起提交。
+    """
+    if not pending_failures:
+        return
+    cursor = conn.cursor()
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM extraction_failures')
+    max_id_before = cursor.fetchone()[0]
     try:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO extraction_failures
-            (邮件主题, 邮件发件人, 邮件日期, 附件文件名, sheet名称, 失败原因)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (email_subject, email_sender, email_date, filename, sheet_name, reason))
-        conn.commit()
-    except Exception as e:
-        # 写入失败日志不应中断主流程
-        conn.rollback()
-        print(f"\n  [警告] 写入失败日志时出错: {e}")
+        cursor.executemany(SQL_LOG_FAIL, pending_failures)
+    except Exception:
+        # 批量写入中途出错（如某个值无法绑定）：撤销本批已写入的部分，再逐条写入并跳过出错的记录
+        cursor.execute('DELETE FROM extraction_failures WHERE id > ?', (max_id_before,))
+        for record in pending_failures:
+            try:
+                cursor.execute(SQL_LOG_FAIL, record)
+            except Exception as e:
+                # 写入失败日志不应中断主流程；出错的语句本身不会生效，
+                # 不回滚事务，以免丢弃同一事务中尚未提交的净值数据
+                print(f"\n  [警告] 写入失败日志时出错: {e}")
+    pending_failures.clear()
 
 
-def decode_str(s):
-    """解码邮件头部信息"""
+def _decode_header_value(s):
+    """解码单个邮件头部值（decode_str 的实际实现）"""
     value, charset = decode_header(s)[0]
     if charset:
         try:
@@ -237,23 +394,194 @@ def decode_str(s):
     return value
 
 
+# 同一发件人/主题在邮箱中大量重复出现，按原始头部字符串缓存解码结果
+_decode_header_value_cached = lru_cache(maxsize=4096)(_decode_header_value)
+
+
+def decode_str(s):
+    """解码邮件头部信息"""
+    # Header 对象（含未知 8bit 字节的头部）不可哈希，直接解码不走缓存
+    if isinstance(s, str):
+        return _decode_header_value_cached(s)
+    return _decode_header_value(s)
+
+
+@lru_cache(maxsize=4096)
+def _decode_filename(filename):
+    """解码附件文件名（按原始文件名字符串缓存）"""
+    decoded_filename = decode_header(filename)[0]
+    if isinstance(decoded_filename[0], bytes):
+        charset = decoded_filename[1]
+        if charset:
+            return decoded_filename[0].decode(charset, errors='ignore')
+        return decoded_filename[0].decode('utf-8', errors='ignore')
+    return decoded_filename[0]
+
+
 def get_attachment_filename(part):
     """获取附件文件名"""
     filename = part.get_filename()
     if filename:
         # 解码文件名
-        decoded_filename = decode_header(filename)[0]
-        if isinstance(decoded_filename[0], bytes):
-            charset = decoded_filename[1]
-            if charset:
-                filename = decoded_filename[0].decode(charset, errors='ignore')
-            else:
-                filename = decoded_filename[0].decode('utf-8', errors='ignore')
-        else:
-            filename = decoded_filename[0]
+        filename = _decode_filename(filename)
     return filename
 
 
+def open_excel_file(attachment_file):
+    """打开 Excel 工作簿，整个附件只解析一次，各工作表都从同一个 ExcelFile 读取
+
+    优先使用 calamine 引擎（Rust 实现，明显快于 openpyxl/xlrd）；
+    未安装 python-calamine、pandas 版本不支持或 calamine 无法打开时回退到默认引擎
+    （pandas 的 openpyxl 读取器本身即以 read_only、data_only 模式打开工作簿）。
+    """
+    if HAS_CALAMINE:
+        try:
+            attachment_file.seek(0)
+            return pd.ExcelFile(attachment_file, engine='calamine')
+        except Exception:
+            pass
+    attachment_file.seek(0)
+    return pd.ExcelFile(attachment_file)
+
+
+def read_sheet_raw(excel_file, sheet_name, nrows=None):
+    """以 header=None 读取单个工作表的原始数据
+
+    dtype=object 跳过类型推断，原始值交由智能提取器统一处理。
+    """
+    return excel_file.parse(sheet_name, header=None, dtype=object, nrows=nrows)
+
+
+def parse_excel_attachment(attachment_file, nrows=None):
+    """解析 Excel 附件内容并用智能提取器提取数据
+
+    先按单个工作表读取；读取失败时再尝试逐个读取所有工作表。
+    工作簿只打开一次，回退路径复用同一个 ExcelFile，不再重复解析整个附件。
+
+    Args:
+        attachment_file: 附件内容的可 seek 文件对象
+        nrows: 每个工作表最多读取的行数。字段标签都在表头区域（前几行），
+            只做格式分析时可传入较小的值（如 30）只解析表头区域；
+            入库流程需要全部数据行，保持默认 None 读取整个工作表
+
+    Returns:
+        sheets: 提取成功的 (sheet名称, extracted_data) 列表
+        failures: 提取失败的 (sheet名称, 失败原因) 列表
+    """
+    sheets = []
+    failures = []
+
+    try:
+        excel_file = open_excel_file(attachment_file)
+    except Exception as e:
+        failures.append(('unknown', f'读取工作表失败: {str(e)}'))
+        return sheets, failures
+
+    with excel_file:
+        try:
+            # 重要：使用 header=None 读取原始数据
+            df = read_sheet_raw(excel_file, 0, nrows=nrows)
+
+            # 使用智能提取器提取数据（返回列表）
+            extracted_data = extract_and_normalize(df)
+
+            if extracted_data:
+                sheets.append(('default', extracted_data))
+            else:
+                failures.append(('default', '无法识别数据格式'))
+
+        except Exception as e:
+            # 如果有多个sheet，尝试读取所有sheet
+            try:
+                for sheet_name in excel_file.sheet_names:
+                    df = read_sheet_raw(excel_file, sheet_name, nrows=nrows)
+
+                    # 使用智能提取器（返回列表）
+                    extracted_data = extract_and_normalize(df)
+
+                    if extracted_data:
+                        sheets.append((sheet_name, extracted_data))
+                    else:
+                        failures.append((sheet_name, '无法识别数据格式'))
+
+            except Exception as e2:
+                if not sheets:
+                    failures.append(('unknown', f'读取工作表失败: {str(e2)}'))
+
+    return sheets, failures
+
+
+# 需要提取数据的 Excel 附件扩展名
+EXCEL_EXTENSIONS = ('.xls', '.xlsx', '.xlsm')
+
+
+# 附件解码缓冲区上限：超过后落盘到临时文件，避免大附件整块驻留内存
+ATTACHMENT_SPOOL_MAX_SIZE = 2 * 1024 * 1024
+
+
+BASE64_DECODE_CHUNK_SIZE = 64 * 1024
+
+
+def decode_base64_payload(payload, out):
+    """将 base64 载荷字符串分块解码并写入 out
+
+    每次只取 BASE64_DECODE_CHUNK_SIZE 个字符，去掉换行等空白后按 4 字符对齐解码，
+    不足 4 个的余下字符并入下一块。数据不规范时抛出 ValueError / binascii.Error。
+    """
+    pending = ''
+    for start in range(0, len(payload), BASE64_DECODE_CHUNK_SIZE):
+        data = pending + ''.join(payload[start:start + BASE64_DECODE_CHUNK_SIZE].split())
+        aligned = len(data) - len(data) % 4
+        out.write(base64.b64decode(data[:aligned], validate=True))
+        pending = data[aligned:]
+    if pending:
+        raise binascii.Error('Incorrect padding')
+
+
+def spool_attachment(part):
+    """将附件内容解码到 SpooledTemporaryFile，返回 (文件对象, 内容 SHA-1 摘要)
+
+    base64 编码的附件直接从邮件中的载荷字符串分块解码，不再生成完整的编码后 bytes 副本，
+    也不在内存中生成完整的解码后 bytes；
+    其他传输编码（或 base64 数据不规范）时回退到 get_payload(decode=True)。
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=ATTACHMENT_SPOOL_MAX_SIZE)
+    encoding = str(part.get('Content-Transfer-Encoding', '')).strip().lower()
+    try:
+        if encoding != 'base64' or part.is_multipart():
+            raise ValueError(encoding)
+        decode_base64_payload(part.get_payload(), spool)
+    except (ValueError, binascii.Error):
+        spool.seek(0)
+        spool.truncate()
+        spool.write(part.get_payload(decode=True) or b'')
+
+    # 分块计算摘要，用于附件解析结果缓存
+    digest = hashlib.sha1()
+    spool.seek(0)
+    for chunk in iter(lambda: spool.read(1 << 16), b''):
+        digest.update(chunk)
+    spool.seek(0)
+    return spool, digest.digest()
+
+
+# 附件解析结果缓存（按附件内容的 SHA-1 摘要），同一附件被多封邮件转发/重发时只解析一次；
+# 每个解析进程各有一份，按 LRU 淘汰，最多保留 ATTACHMENT_CACHE_SIZE 个附件的解析结果
+ATTACHMENT_CACHE_SIZE = 256
+_parsed_attachments = OrderedDict()
+
+
+def parse_excel_attachment_cached(attachment_file, digest):
+    """带内容哈希 LRU 缓存的 parse_excel_attachment"""
+    if digest in _parsed_attachments:
+        _parsed_attachments.move_to_end(digest)
+        return _parsed_attachments[digest]
+    result = _parsed_attachments[digest] = parse_excel_attachment(attachment_file)
+    if len(_parsed_attachments) > ATTACHMENT_CACHE_SIZE:
+        _parsed_attachments.popitem(last=False)
+    return result
+
+
 def extract_excel_attachments(msg, failed_extractions):
     """提取邮件中的Excel附件并使用智能提取器读取数据
 
@@ -269,94 +597,45 @@ def extract_excel_attachments(msg, failed_extractions):
 
     if msg.is_multipart():
         for part in msg.walk():
-            content_disposition = str(part.get("Content-Disposition"))
-            content_type = part.get_content_type()
+            # multipart 容器与没有 Content-Disposition 的正文部分不可能是附件，直接跳过
+            if part.is_multipart():
+                continue
+            content_disposition = part.get("Content-Disposition")
+            if content_disposition is None:
+                continue
 
             # 检查是否是附件
-            if "attachment" in content_disposition:
+            if "attachment" in str(content_disposition):
                 filename = get_attachment_filename(part)
 
                 if filename:
                     # 检查是否是Excel文件
-                    if filename.lower().endswith(('.xls', '.xlsx', '.xlsm')):
+                    if filename.lower().endswith(EXCEL_EXTENSIONS):
                         has_excel = True
 
                         try:
-                            # 获取附件数据
-                            attachment_data = part.get_payload(decode=True)
-
-                            # 直接从内存读取Excel，不保存到本地
-                            extraction_success = False
-                            try:
-                                # 使用BytesIO将二进制数据转换为文件对象
-                                excel_buffer = BytesIO(attachment_data)
-                                # 重要：使用 header=None 读取原始数据
-                                df = pd.read_excel(excel_buffer, header=None)
-
-                                # 使用智能提取器提取数据（返回列表）
-                                extracted_data = extract_and_normalize(df)
-
-                                if extracted_data:
-                                    # extracted_data 是 list of dict，直接构建多行DataFrame
-                                    df_normalized = pd.DataFrame(extracted_data)
-
-                                    dataframes.append({
-                                        'filename': filename,
-                                        'data': df_normalized,
-                                        'sheet_name': 'default',
-                                        'extracted_data': extracted_data
-                                    })
-                                    extraction_success = True
-                                else:
-                                    failed_extractions.append({
-                                        'filename': filename,
-                                        'sheet_name': 'default',
-                                        'reason': '无法识别数据格式',
-                                        'product_name': None,
-                                        'product_code': None
-                                    })
-
-                            except Exception as e:
-                                # 如果有多个sheet，尝试读取所有sheet
-                                try:
-                                    excel_buffer = BytesIO(attachment_data)
-                                    excel_file = pd.ExcelFile(excel_buffer)
-                                    sheet_success = False
-                                    for sheet_name in excel_file.sheet_names:
-                                        excel_buffer = BytesIO(attachment_data)
-                                        df = pd.read_excel(excel_buffer, sheet_name=sheet_name, header=None)
-
-                                        # 使用智能提取器（返回列表）
-                                        extracted_data = extract_and_normalize(df)
-
-                                        if extracted_data:
-                                            df_normalized = pd.DataFrame(extracted_data)
-                                            dataframes.append({
-                                                'filename': filename,
-                                                'data': df_normalized,
-                                                'sheet_name': sheet_name,
-                                                'extracted_data': extracted_data
-                                            })
-                                            sheet_success = True
-                                            extraction_success = True
-                                        else:
-                                            failed_extractions.append({
-                                                'filename': filename,
-                                                'sheet_name': sheet_name,
-                                                'reason': '无法识别数据格式',
-                                                'product_name': None,
-                                                'product_code': None
-                                            })
-
-                                except Exception as e2:
-                                    if not extraction_success:
-                                        failed_extractions.append({
-                                            'filename': filename,
-                                            'sheet_name': 'unknown',
-                                            'reason': f'读取工作表失败: {str(e2)}',
-                                            'product_name': None,
-                                            'product_code': None
-                                        })
+                            # 附件解码到有上限的缓冲区（超限部分落盘），直接从中读取Excel
+                            attachment_file, digest = spool_attachment(part)
+                            with attachment_file:
+                                sheets, failures = parse_excel_attachment_cached(attachment_file, digest)
+
+                            for sheet_name, extracted_data in sheets:
+                                # extracted_data 是 list of dict，直接构建多行DataFrame
+                                dataframes.append({
+                                    'filename': filename,
+                                    'data': pd.DataFrame(extracted_data),
+                                    'sheet_name': sheet_name,
+                                    'extracted_data': extracted_data
+                                })
+
+                            for sheet_name, reason in failures:
+                                failed_extractions.append({
+                                    'filename': filename,
+                                    'sheet_name': sheet_name,
+                                    'reason': reason,
+                                    'product_name': None,
+                                    'product_code': None
+                                })
 
                         except Exception as e:
                             failed_extractions.append({
@@ -373,6 +652,8 @@ def extract_excel_attachments(msg, failed_extractions):
 def insert_data_to_db(conn, df, failed_inserts, source_id=None):
     """将DataFrame数据插入数据库（仅插入核心字段）
 
+    校验通过的行用一次 executemany 批量写入；本函数不提交事务，由调用方按批次统一提交。
+
     Args:
         conn: 数据库连接
         df: 要插入的数据框
@@ -384,66 +665,81 @@ def insert_data_to_db(conn, df, failed_inserts, source_id=None):
         skipped_count: 跳过的数量
     """
     cursor = conn.cursor()
-    inserted_count = 0
     skipped_count = 0
+    fund_ids = {}  # 产品代码 -> fund_id，同一 DataFrame 内每个产品代码只查询一次
+    valid_rows = []  # (行号, 插入参数)
 
-    for _, row in df.iterrows():
+    # 按列一次性取出核心字段（缺失的列视为全 None），避免 iterrows 逐行构造 Series
+    names, codes, nav_dates, navs, accum_navs = (
+        df[column].tolist() if column in df.columns else [None] * len(df)
+        for column in ('产品名称', '产品代码', '净值日期', '单位净值', '累计单位净值')
+    )
+    # 唯一键统一为不带 '.0' 后缀的形式（如 .xls 中以浮点数存储的代码/日期）
+    codes = [normalize_key(code) for code in codes]
+    nav_dates = [normalize_key(nav_date) for nav_date in nav_dates]
+
+    def failure(i, reason):
+        # 完整的行数据只在失败时才构造
+        return {
+            'product_name': names[i],
+            'product_code': codes[i],
+            'reason': reason,
+            'data': df.iloc[i].to_dict()
+        }
+
+    for i, (product_name, product_code, nav_date, nav, accum_nav) in enumerate(
+            zip(names, codes, nav_dates, navs, accum_navs)):
         try:
             # 验证必需字段
-            if not row.get('产品代码') or not row.get('净值日期') or not row.get('单位净值'):
-                reason = "缺少必需字段: "
+            if not product_code or not nav_date or not nav:
                 missing_fields = []
-                if not row.get('产品代码'):
+                if not product_code:
                     missing_fields.append('产品代码')
-                if not row.get('净值日期'):
+                if not nav_date:
                     missing_fields.append('净值日期')
-                if not row.get('单位净值'):
+                if not nav:
                     missing_fields.append('单位净值')
-                reason += ', '.join(missing_fields)
-
-                failed_inserts.append({
-                    'product_name': row.get('产品名称'),
-                    'product_code': row.get('产品代码'),
-                    'reason': reason,
-                    'data': row.to_dict()
-                })
+
+                failed_inserts.append(failure(i, "缺少必需字段: " + ', '.join(missing_fields)))
                 skipped_count += 1
                 continue
 
             # 获取或创建该产品的 fund_id（优先用于唯一标识基金）
-            fund_id = get_or_create_fund_id(conn, row.get('产品代码'), row.get('产品名称'))
-
-            cursor.execute('''
-                INSERT OR IGNORE INTO fund_nav_data
-                (fund_id, 产品名称, 产品代码, 净值日期, 单位净值, 累计单位净值, source_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                fund_id,
-                row.get('产品名称'),
-                row.get('产品代码'),
-                row.get('净值日期'),
-                row.get('单位净值'),
-                row.get('累计单位净值'),
+            if product_code not in fund_ids:
+                fund_ids[product_code] = get_or_create_fund_id(conn, product_code, product_name)
+
+            valid_rows.append((i, (
+                fund_ids[product_code],
+                product_name,
+                product_code,
+                nav_date,
+                nav,
+                accum_nav,
                 source_id
-            ))
-
-            if cursor.rowcount > 0:
-                inserted_count += 1
-            else:
-                # 数据已存在
-                skipped_count += 1
+            )))
 
         except Exception as e:
-            reason = f"插入数据库失败: {str(e)}"
-            failed_inserts.append({
-                'product_name': row.get('产品名称'),
-                'product_code': row.get('产品代码'),
-                'reason': reason,
-                'data': row.to_dict()
-            })
+            failed_inserts.append(failure(i, f"插入数据库失败: {str(e)}"))
             skipped_count += 1
 
-    conn.commit()
+    # 新插入的记录 id 严格递增（AUTOINCREMENT），按写入前的最大 id 统计实际插入条数；
+    # 补全累计单位净值的已有记录不计入，与重复数据、插入失败一起计为跳过
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM fund_nav_data')
+    max_id_before = cursor.fetchone()[0]
+    try:
+        cursor.executemany(SQL_INSERT_NAV, [params for _, params in valid_rows])
+    except Exception:
+        # 批量写入中途出错（如某行的值无法绑定）：逐行重试以定位失败的记录；
+        # 出错前已写入的行重试时按唯一约束冲突处理，不会重复写入
+        for i, params in valid_rows:
+            try:
+                cursor.execute(SQL_INSERT_NAV, params)
+            except Exception as e:
+                failed_inserts.append(failure(i, f"插入数据库失败: {str(e)}"))
+
+    cursor.execute('SELECT COUNT(*) FROM fund_nav_data WHERE id > ?', (max_id_before,))
+    inserted_count = cursor.fetchone()[0]
+    skipped_count += len(valid_rows) - inserted_count
     return inserted_count, skipped_count
 
 
@@ -468,16 +764,10 @@ def print_failure_report(failed_extractions, failed_inserts):
         print("1. 数据提取失败的邮件（无法识别Excel格式）")
         print("-"*80)
 
-        # 按基金名称去重，只显示唯一的失败案例
+        # 使用文件名作为唯一标识去重（单次遍历，保留每个文件的第一条记录），只显示唯一的失败案例
         unique_failures = {}
         for record in failed_extractions:
-            email_subject = record.get('email_subject', '未知')
-            filename = record.get('filename', '未知')
-
-            # 使用文件名作为唯一标识
-            key = filename
-            if key not in unique_failures:
-                unique_failures[key] = record
+            unique_failures.setdefault(record.get('filename', '未知'), record)
 
         for idx, (key, record) in enumerate(unique_failures.items(), 1):
             email_subject = record.get('email_subject', '未知')
@@ -503,8 +793,7 @@ def print_failure_report(failed_extractions, failed_inserts):
 
             # 使用产品代码作为唯一标识
             key = product_code if product_code and product_code != '未知' else record.get('filename', '未知')
-            if key not in unique_failures:
-                unique_failures[key] = record
+            unique_failures.setdefault(key, record)
 
         for idx, (key, record) in enumerate(unique_failures.items(), 1):
             product_name = record.get('product_name', '未知')
@@ -524,8 +813,8 @@ def print_failure_report(failed_extractions, failed_inserts):
     print("问题总结")
     print("="*80)
 
-    total_failures = len(set([r.get('filename') for r in failed_extractions])) + \
-                     len(set([r.get('product_code') for r in failed_inserts if r.get('product_code')]))
+    total_failures = len({r.get('filename') for r in failed_extractions}) + \
+                     len({code for code in (r.get('product_code') for r in failed_inserts) if code})
 
     print(f"\n共有 {total_failures} 个不同的失败案例")
 
@@ -579,59 +868,261 @@ def query_and_display_data(conn):
     print("\n" + "="*80)
 
 
-def get_email_content(msg):
-    """递归解析邮件内容"""
-    content = ""
+# FETCH 响应中的 UID 数据项，如 b'3 (UID 1024 BODY[] {2048}'
+_FETCH_UID_RE = re.compile(rb'UID (\d+)')
 
-    if msg.is_multipart():
-        # 如果邮件是多部分的，递归解析每一部分
-        for part in msg.walk():
-            content_type = part.get_content_type()
-            content_disposition = str(part.get("Content-Disposition"))
 
-            # 跳过附件
-            if "attachment" in content_disposition:
-                continue
+def parse_fetch_response(fetch_data):
+    """解析批量 UID FETCH 的响应，返回 {uid(int): 邮件原文(bytes)}
 
-            # 获取文本内容
-            if content_type == "text/plain":
-                try:
-                    body = part.get_payload(decode=True)
-                    charset = part.get_content_charset()
-                    if charset:
-                        content += body.decode(charset, errors='ignore')
-                    else:
-                        content += body.decode('utf-8', errors='ignore')
-                except:
-                    pass
-            elif content_type == "text/html":
-                try:
-                    body = part.get_payload(decode=True)
-                    charset = part.get_content_charset()
-                    if charset:
-                        html_content = body.decode(charset, errors='ignore')
-                    else:
-                        html_content = body.decode('utf-8', errors='ignore')
-                    # 如果没有纯文本内容，则使用HTML内容
-                    if not content:
-                        content += "\n[HTML内容]:\n" + html_content
-                except:
-                    pass
-    else:
-        # 单部分邮件
-        content_type = msg.get_content_type()
-        body = msg.get_payload(decode=True)
-        charset = msg.get_content_charset()
+    UID 数据项可能出现在邮件字面量之前（同一元组的头部），
+    也可能出现在之后（紧随元组的 bytes 片段），两种情况都需处理。
+    """
+    messages = {}
+    pending = None
+    for item in fetch_data:
+        if isinstance(item, tuple):
+            match = _FETCH_UID_RE.search(item[0])
+            if match:
+                messages[int(match.group(1))] = item[1]
+                pending = None
+            else:
+                pending = item[1]
+        elif pending is not None and isinstance(item, bytes):
+            match = _FETCH_UID_RE.search(item)
+            if match:
+                messages[int(match.group(1))] = pending
+            pending = None
+    return messages
+
+
+# 单条 UID FETCH 命令中 UID 集合字符串的长度上限，避免超出服务器的最大请求长度
+MAX_UID_SET_LENGTH = 8 * 1024
+
+
+def split_uid_batches(uid_list, batch_size, max_set_length=MAX_UID_SET_LENGTH):
+    """将 UID 列表切分为批次：每批最多 batch_size 个，且逗号拼接后的长度不超过 max_set_length"""
+    batch = []
+    set_length = 0
+    for uid in uid_list:
+        added = len(uid) + (1 if batch else 0)
+        if batch and (len(batch) >= batch_size or set_length + added > max_set_length):
+            yield batch
+            batch = []
+            added = len(uid)
+            set_length = 0
+        batch.append(uid)
+        set_length += added
+    if batch:
+        yield batch
+
+
+def compress_uid_set(uids):
+    """将 UID 列表压缩为 IMAP 序列集合，连续的 UID 合并为 start:end，如 [1, 2, 3, 5] -> b'1:3,5'"""
+    ranges = []
+    start = prev = None
+    for uid in map(int, uids):
+        if prev is not None and uid == prev + 1:
+            prev = uid
+            continue
+        if start is not None:
+            ranges.append(f'{start}:{prev}' if prev != start else str(start))
+        start = prev = uid
+    if start is not None:
+        ranges.append(f'{start}:{prev}' if prev != start else str(start))
+    return ','.join(ranges).encode()
+
+
+# 预取邮件结构时一并拉取的邮件头字段，足以生成主题、发件人、日期等统计信息
+FETCH_STRUCTURE_ITEMS = '(UID BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS (SUBJECT FROM DATE)])'
+
+# 一封邮件响应的起始片段，如 b'3 (UID 1024 BODYSTRUCTURE ...'
+_FETCH_START_RE = re.compile(rb'\d+ \(')
+# 邮件头字面量之前的数据项名称，如 b'BODY[HEADER.FIELDS (SUBJECT FROM DATE)] {96}'
+_HEADER_LITERAL_RE = re.compile(rb'BODY\[HEADER\.FIELDS [^\]]*\] \{\d+\}$')
+
+
+def parse_structure_response(fetch_data):
+    """解析 UID FETCH FETCH_STRUCTURE_ITEMS 的响应，返回 {uid(int): (结构文本(小写 bytes), 邮件头(bytes))}
+
+    BODYSTRUCTURE 中的字符串（如附件名）可能以字面量形式返回，一封邮件的响应会被拆成多个片段，
+    因此先按 "序号 (" 开头的片段切分出每封邮件，再把邮件头字面量以外的内容拼接为结构文本。
+    """
+    groups = []
+    for item in fetch_data:
+        prefix = item[0] if isinstance(item, tuple) else item
+        if not isinstance(prefix, bytes):
+            continue
+        if not groups or _FETCH_START_RE.match(prefix):
+            groups.append([])
+        groups[-1].append(item)
+
+    structures = {}
+    for group in groups:
+        text = b''
+        header = None
+        for item in group:
+            if isinstance(item, tuple):
+                prefix, literal = item
+                text += prefix
+                if _HEADER_LITERAL_RE.search(prefix.rstrip()):
+                    header = literal
+                else:
+                    text += literal
+            else:
+                text += item
+        match = _FETCH_UID_RE.search(text)
+        if match and header is not None:
+            structures[int(match.group(1))] = (text.lower(), header)
+    return structures
+
+
+def may_have_attachment(structure):
+    """根据 BODYSTRUCTURE 判断邮件是否可能带有 Excel 附件（宁可误判为有，也不漏掉）
+
+    带有 attachment 处置、application/* 类型或 .xls 文件名的邮件都视为可能有附件；
+    纯文本、HTML、内嵌图片等邮件才会被跳过。
+    """
+    return b'attachment' in structure or b'application' in structure or b'.xls' in structure
+
+
+def fetch_email_batch(imap_client, batch):
+    """拉取一批邮件，返回 [(uid, raw_email)]
 
+    先用一条 UID FETCH 命令拉取整批邮件的 BODYSTRUCTURE 和邮件头，
+    不可能带 Excel 附件的邮件（如通知、广告）只返回邮件头，不再下载正文，也省去后续解析；
+    其余邮件再用一条 UID FETCH 命令拉取原文。结构预取失败时整批都拉取原文。
+    显式请求 UID 数据项，按 UID 将响应与请求对应起来。
+    使用 BODY.PEEK[] 而不是 RFC822 拉取原文，不会把邮件标记为已读（\\Seen）。
+    服务器未返回某封邮件（如已被删除）或整批拉取失败时，该邮件的 raw_email 为 None。
+    """
+    headers = {}
+    try:
+        status, fetch_data = imap_client.uid('fetch', compress_uid_set(batch), FETCH_STRUCTURE_ITEMS)
+        if status == 'OK':
+            for uid, (structure, header) in parse_structure_response(fetch_data).items():
+                if not may_have_attachment(structure):
+                    headers[uid] = header
+    except Exception:
+        headers = {}
+
+    messages = {}
+    to_fetch = [uid for uid in batch if int(uid) not in headers]
+    if to_fetch:
         try:
-            if charset:
-                content = body.decode(charset, errors='ignore')
-            else:
-                content = body.decode('utf-8', errors='ignore')
-        except:
-            content = str(body)
+            status, fetch_data = imap_client.uid('fetch', compress_uid_set(to_fetch), '(UID BODY.PEEK[])')
+            messages = parse_fetch_response(fetch_data) if status == 'OK' else {}
+        except Exception as e:
+            print(f"\n  [错误] 批量拉取邮件失败（UID {to_fetch[0].decode()} ~ {to_fetch[-1].decode()}）: {e}")
+    messages.update(headers)
+
+    return [(uid, messages.get(int(uid))) for uid in batch]
+
+
+def fetch_emails_in_batches(imap_client, uid_list, batch_size=100, prefetch_messages=100):
+    """按批次拉取邮件原文，逐封产出 (uid, raw_email)
+
+    每批只发送一条 UID FETCH 命令，避免逐封请求时每封邮件都要等待一次服务器往返；
+    UID 集合中连续的部分压缩为 start:end 区间，缩短命令长度。
+    拉取在后台线程中进行，调用方处理当前邮件时，后续批次已在传输。队列按邮件逐封入队、
+    最多缓存 prefetch_messages 封，内存中的邮件原文约为该上限加上正在拉取的一批。
+    imaplib 不是线程安全的，遍历期间所有 IMAP 命令都只由该后台线程发出；
+    生成器结束或被关闭时会通知后台线程停止并等待其退出，之后调用方才能继续使用 imap_client。
+    后台线程中的异常会在调用方遍历时重新抛出，不会被当作正常结束而静默截断。
+    """
+    fetched_emails = queue.Queue(maxsize=prefetch_messages)
+    stop = threading.Event()
+
+    def put(item):
+        # 队列已满时定期检查停止标志，调用方提前退出后不会一直阻塞
+        while not stop.is_set():
+            try:
+                fetched_emails.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def producer():
+        try:
+            for batch in split_uid_batches(uid_list, batch_size):
+                if stop.is_set():
+                    return
+                for item in fetch_email_batch(imap_client, batch):
+                    if not put(('email', item)):
+                        return
+        except Exception as e:
+            put(('error', e))
+        else:
+            put(('done', None))  # 结束标记
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, item = fetched_emails.get()
+            if kind == 'error':
+                raise item
+            if kind == 'done':
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def parse_email(raw_email):
+    """解析单封邮件的头部信息并提取其中的 Excel 附件数据
+
+    只做解析、不访问数据库，可在子进程中执行。
+
+    Returns:
+        (subject, sender, date_header, dataframes, has_excel, failed_extractions)
+    """
+    if raw_email is None:
+        raise ValueError("服务器未返回邮件内容")
+
+    # 解析邮件
+    msg = email.message_from_bytes(raw_email)
+
+    # 获取邮件基本信息
+    subject_header = msg.get("Subject")
+    subject = decode_str(subject_header) if subject_header else "(无主题)"
+
+    from_header = msg.get("From")
+    sender = decode_str(from_header) if from_header else "(未知发件人)"
+
+    date_header = msg.get("Date")
+
+    # 提取Excel附件
+    failed_extractions = []
+    dataframes, has_excel = extract_excel_attachments(msg, failed_extractions)
+
+    return subject, sender, date_header, dataframes, has_excel, failed_extractions
+
+
+# 解析进程的启动方式：优先 forkserver（Linux），不支持时用 spawn（Windows/macOS 的默认方式）
+PARSE_MP_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+
+def parse_emails_in_pool(fetched, workers):
+    """在进程池中并行解析邮件，按原顺序逐封产出 (uid, future)
 
-    return content
+    Excel 解析是纯 CPU 计算且各邮件相互独立，交给多个子进程并行处理；
+    最多预先提交 workers * 4 封邮件，既让子进程保持忙碌，又限制内存中待处理的邮件数量。
+    解析出错时异常在调用 future.result() 时抛出。
+    子进程不用 fork 方式创建：此时后台拉取线程已在运行（可能正持有锁或处于 SSL 读写中），
+    fork 多线程进程可能死锁，子进程还会继承数据库连接和 IMAP 套接字。
+    """
+    with ProcessPoolExecutor(max_workers=workers, mp_context=PARSE_MP_CONTEXT) as executor:
+        pending = deque()
+        for uid, raw_email in fetched:
+            pending.append((uid, executor.submit(parse_email, raw_email)))
+            if len(pending) > workers * 4:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
 
 
 def connect_and_fetch_email(email_user, email_pwd, db_path):
@@ -639,7 +1130,8 @@ def connect_and_fetch_email(email_user, email_pwd, db_path):
 
     # 初始化数据库，读取上次同步状态
     conn = init_database(db_path)
-    last_uid, stored_uidvalidity = get_sync_state(conn)
+    last_uid, stored_uidvalidity, stored_modseq = get_sync_state(conn)
+    pending_failures = []  # 待批量写入 extraction_failures 的失败记录
 
     # 步骤1: 连接到IMAP服务器
     print("正在连接到163邮箱IMAP服务器...")
@@ -688,6 +1180,14 @@ def connect_and_fetch_email(email_user, email_pwd, db_path):
         print(f"警告: 发送ID命令时出错: {e}")
         print("继续尝试访问邮箱...")
 
+    # 服务器支持 CONDSTORE 时启用，SELECT 会返回 HIGHESTMODSEQ，
+    # 据此可在邮箱自上次同步以来没有任何变化时跳过 UID SEARCH
+    if 'CONDSTORE' in imap_client.capabilities and 'ENABLE' in imap_client.capabilities:
+        try:
+            imap_client.enable('CONDSTORE')
+        except Exception as e:
+            print(f"警告: 启用 CONDSTORE 失败: {e}")
+
     # 步骤4: 选择收件箱
     print("\n正在打开收件箱...")
     try:
@@ -721,6 +1221,10 @@ def connect_and_fetch_email(email_user, email_pwd, db_path):
         uidvalidity_list = imap_client.untagged_responses.get('UIDVALIDITY', [b'0'])
         server_uidvalidity = uidvalidity_list[0].decode() if uidvalidity_list else '0'
 
+        # 获取服务器的 HIGHESTMODSEQ（未启用 CONDSTORE 时没有该响应）
+        modseq_list = imap_client.untagged_responses.get('HIGHESTMODSEQ')
+        server_modseq = modseq_list[0].decode() if modseq_list else None
+
     except Exception as e:
         print(f"打开收件箱失败: {e}")
         imap_client.logout()
@@ -746,15 +1250,21 @@ def connect_and_fetch_email(email_user, email_pwd, db_path):
             else:
                 print("首次运行，执行全量扫描")
             status, uid_data = imap_client.uid('search', None, 'ALL')
+        elif server_modseq is not None and server_modseq == stored_modseq:
+            # 邮箱内任何变化（新邮件、删除、标记变更）都会使 HIGHESTMODSEQ 增大，未变则无需搜索
+            print(f"增量模式：邮箱自上次同步以来没有变化（HIGHESTMODSEQ={server_modseq}）")
+            uid_data = [b'']
         else:
             print(f"增量模式：拉取 UID > {last_uid} 的新邮件")
             status, uid_data = imap_client.uid('search', None, f'UID {last_uid + 1}:*')
 
-        uid_list = uid_data[0].split()  # 每个元素是 bytes 类型的 UID
+        # 每个元素是 bytes 类型的 UID；RFC 3501 不保证 SEARCH 结果有序，按数值排序一次，
+        # 之后按升序处理，已处理到的最大 UID 就是最近一封成功处理的邮件的 UID
+        uid_list = sorted(uid_data[0].split(), key=int)
 
         if not uid_list:
             print("没有新邮件需要处理。")
-            save_sync_state(conn, last_uid, server_uidvalidity)
+            save_sync_state(conn, last_uid, server_uidvalidity, server_modseq)
             query_and_display_data(conn)
             conn.close()
             imap_client.close()
@@ -773,107 +1283,113 @@ def connect_and_fetch_email(email_user, email_pwd, db_path):
 
         total_emails = len(uid_list)
         max_uid = last_uid  # 记录本次处理到的最大 UID
+        commit_interval = 200  # 每处理这么多封邮件提交一次事务（同时保存同步位点）
         print(f"共 {total_emails} 封新邮件需要处理\n")
 
-        # 遍历每封邮件（使用 UID fetch）
-        for idx, uid in enumerate(uid_list, 1):
-            # 显示进度条
-            progress = idx / total_emails * 100
-            bar_length = 50
-            filled_length = int(bar_length * idx // total_emails)
-            bar = '█' * filled_length + '-' * (bar_length - filled_length)
-            print(f'\r进度: [{bar}] {progress:.1f}% ({idx}/{total_emails})', end='', flush=True)
+        # 遍历每封邮件（按批次 UID fetch）；邮件解析在进程池中并行执行，
+        # 数据库写入仍在主进程中按邮件顺序串行进行
+        parse_workers = max(1, int(os.getenv('PARSE_WORKERS', os.cpu_count() or 1)))
+        fetched = fetch_emails_in_batches(imap_client, uid_list)
+        parsed = parse_emails_in_pool(fetched, parse_workers)
+        try:
+            for idx, (uid, parse_future) in enumerate(parsed, 1):
+                # 显示进度条
+                progress = idx / total_emails * 100
+                bar_length = 50
+                filled_length = int(bar_length * idx // total_emails)
+                bar = '█' * filled_length + '-' * (bar_length - filled_length)
+                print(f'\r进度: [{bar}] {progress:.1f}% ({idx}/{total_emails})', end='', flush=True)
 
-            try:
-                # 使用 UID fetch 获取邮件原文
-                status, email_data = imap_client.uid('fetch', uid, '(RFC822)')
-
-                # 解析邮件
-                raw_email = email_data[0][1]
-                msg = email.message_from_bytes(raw_email)
-
-                # 获取邮件基本信息
-                subject_header = msg.get("Subject")
-                subject = decode_str(subject_header) if subject_header else "(无主题)"
-
-                from_header = msg.get("From")
-                sender = decode_str(from_header) if from_header else "(未知发件人)"
-
-                date_header = msg.get("Date")
-
-                # 提取Excel附件
-                email_failed_extractions = []
-                dataframes, has_excel = extract_excel_attachments(msg, email_failed_extractions)
-
-                if dataframes:
-                    emails_with_attachments += 1
-
-                    # 将数据插入数据库
-                    for df_info in dataframes:
-                        df = df_info['data']
-                        email_failed_inserts = []
-                        source_id = insert_email_source(
-                            conn, subject, sender, date_header,
-                            df_info['filename'], df_info['sheet_name']
-                        )
-                        inserted, skipped = insert_data_to_db(conn, df, email_failed_inserts, source_id)
-                        total_data_inserted += inserted
-
-                        # 记录插入失败的记录（排除重复数据）
-                        for fail_record in email_failed_inserts:
+                try:
+                    # 获取解析结果：邮件基本信息与提取出的Excel附件数据
+                    (subject, sender, date_header, dataframes, has_excel,
+                     email_failed_extractions) = parse_future.result()
+
+                    if dataframes:
+                        emails_with_attachments += 1
+
+                        # 将数据插入数据库
+                        for df_info in dataframes:
+                            df = df_info['data']
+                            email_failed_inserts = []
+                            source_id = insert_email_source(
+                                conn, subject, sender, date_header,
+                                df_info['filename'], df_info['sheet_name']
+                            )
+                            inserted, skipped = insert_data_to_db(conn, df, email_failed_inserts, source_id)
+                            total_data_inserted += inserted
+
+                            # 记录插入失败的记录（排除重复数据）
+                            for fail_record in email_failed_inserts:
+                                fail_record['email_subject'] = subject
+                                fail_record['email_date'] = date_header
+                                fail_record['filename'] = df_info['filename']
+                                failed_insert_records.append(fail_record)
+                                # 持久化到数据库（仅记录真正的失败，跳过重复数据）
+                                if '缺少必需字段' in fail_record.get('reason', '') or \
+                                   '插入数据库失败' in fail_record.get('reason', ''):
+                                    pending_failures.append((
+                                        subject, sender, date_header,
+                                        df_info['filename'], '',
+                                        fail_record.get('reason', '')
+                                    ))
+
+                    # 记录提取失败的附件
+                    if email_failed_extractions:
+                        for fail_record in email_failed_extractions:
                             fail_record['email_subject'] = subject
                             fail_record['email_date'] = date_header
-                            fail_record['filename'] = df_info['filename']
-                            failed_insert_records.append(fail_record)
-                            # 持久化到数据库（仅记录真正的失败，跳过重复数据）
-                            if '缺少必需字段' in fail_record.get('reason', '') or \
-                               '插入数据库失败' in fail_record.get('reason', ''):
-                                log_extraction_failure(
-                                    conn, subject, sender, date_header,
-                                    df_info['filename'], '',
-                                    fail_record.get('reason', '')
-                                )
-
-                # 记录提取失败的附件
-                if email_failed_extractions:
-                    for fail_record in email_failed_extractions:
-                        fail_record['email_subject'] = subject
-                        fail_record['email_date'] = date_header
-                        failed_extraction_emails.append(fail_record)
-                        # 持久化到数据库
-                        log_extraction_failure(
-                            conn, subject, sender, date_header,
-                            fail_record.get('filename', ''),
-                            fail_record.get('sheet_name', ''),
-                            fail_record.get('reason', '')
-                        )
-
-                # 如果有Excel但是都提取失败了
-                if has_excel and not dataframes:
-                    pass  # 已在failed_extraction_emails中记录
-                elif not has_excel:
-                    # 没有附件的邮件
-                    emails_without_attachments.append({
-                        'id': uid.decode(),
-                        'subject': subject,
-                        'sender': sender,
-                        'date': date_header
-                    })
-
-                # 更新已处理到的最大 UID
-                max_uid = max(max_uid, int(uid))
-                total_processed += 1
-
-            except Exception as e:
-                print(f"\n  [错误] 处理邮件 UID={uid.decode()} 时出错: {e}")
-                import traceback
-                traceback.print_exc()
+                            failed_extraction_emails.append(fail_record)
+                            # 持久化到数据库（先缓冲，提交前批量写入）
+                            pending_failures.append((
+                                subject, sender, date_header,
+                                fail_record.get('filename', ''),
+                                fail_record.get('sheet_name', ''),
+                                fail_record.get('reason', '')
+                            ))
+
+                    # 如果有Excel但是都提取失败了
+                    if has_excel and not dataframes:
+                        pass  # 已在failed_extraction_emails中记录
+                    elif not has_excel:
+                        # 没有附件的邮件
+                        emails_without_attachments.append({
+                            'id': uid.decode(),
+                            'subject': subject,
+                            'sender': sender,
+                            'date': date_header
+                        })
+
+                    # 更新已处理到的最大 UID（UID 升序处理，直接赋值即可）
+                    max_uid = int(uid)
+                    total_processed += 1
+
+                except Exception as e:
+                    print(f"\n  [错误] 处理邮件 UID={uid.decode()} 时出错: {e}")
+                    import traceback
+                    traceback.print_exc()
+
+                # 按批次写入失败记录并提交，而不是每个附件/每条失败提交一次；
+                # 同步位点随同一事务保存，中途中断时下次只需重做最后一个批次
+                if idx % commit_interval == 0:
+                    log_extraction_failures(conn, pending_failures)
+                    save_sync_state(conn, max_uid, server_uidvalidity)
+        finally:
+            # 提前退出（如出错）时也要关闭进程池并停止后台拉取线程，之后才能在主线程中关闭 IMAP 连接
+            parsed.close()
+            fetched.close()
 
         # 完成进度显示
         print()  # 换行
 
-        # 保存同步状态（记录本次处理到的最大 UID）
-        save_sync_state(conn, max_uid, server_uidvalidity)
+        # 保存同步状态（记录本次处理到的最大 UID），与剩余的失败记录一起提交。
+        # 只有列表中最后一封邮件也处理成功时才算同步完毕并记录 HIGHESTMODSEQ；
+        # 否则清除它，下次同步回退到 UID SEARCH，重试 last_uid 之后未处理的邮件
+        log_extraction_failures(conn, pending_failures)
+        if max_uid == int(uid_list[-1]):
+            save_sync_state(conn, max_uid, server_uidvalidity, server_modseq)
+        else:
+            save_sync_state(conn, max_uid, server_uidvalidity, clear_highestmodseq=True)
         print(f"同步状态已更新：last_uid={max_uid}")
 
         # 显示统计信息
@@ -899,6 +1415,8 @@ def connect_and_fetch_email(email_user, email_pwd, db_path):
     # 步骤6: 关闭连接
     print("\n正在关闭连接...")
     try:
+        log_extraction_failures(conn, pending_failures)
+        conn.commit()
         conn.close()
         imap_client.close()
         imap_client.logout()
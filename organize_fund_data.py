@@ -8,6 +8,44 @@
 import sqlite3
 import pandas as pd
 from datetime import datetime
+from openpyxl import Workbook
+
+# 分块读取明细数据时每块的行数
+READ_CHUNK_SIZE = 10000
+
+
+def append_rows(ws, df):
+    """将 DataFrame 的数据行逐行追加到工作表（不含表头与索引），空值（NaN/None）写为空单元格"""
+    values = df.astype(object).where(df.notna(), None)
+    for row in values.itertuples(index=False, name=None):
+        ws.append(row)
+
+
+def unique_sheet_name(name, used_names):
+    """生成不超过31个字符、且不与已有工作表重名（不区分大小写）的工作表名称
+
+    截断后重名时在末尾加 _2、_3 ... 区分；used_names 为已用名称的小写集合，会加入新名称。
+    """
+    sheet_name = name[:31]
+    n = 1
+    while sheet_name.lower() in used_names:
+        n += 1
+        suffix = f'_{n}'
+        sheet_name = name[:31 - len(suffix)] + suffix
+    used_names.add(sheet_name.lower())
+    return sheet_name
+
+
+def write_sheet(wb, sheet_name, df):
+    """将 DataFrame 写入只写模式工作簿的新工作表（含表头，不含索引），返回该工作表
+
+    只写模式下每行写入后即序列化，不在内存中保留全部单元格对象。
+    """
+    ws = wb.create_sheet(sheet_name)
+    ws.append(list(df.columns))
+    append_rows(ws, df)
+    return ws
+
 
 def organize_fund_data():
     """整理基金数据并输出"""
@@ -18,6 +56,8 @@ def organize_fund_data():
     print("正在读取数据库...")
 
     # 查询所有数据，按产品代码和净值日期排序
+    # （UNIQUE(产品代码, 净值日期) 的自动索引即按此顺序，SQLite 沿索引扫描、无需额外排序；
+    # 之后的分组与写入都依赖该顺序，pandas 中不再排序）
     query = '''
         SELECT
             产品名称,
@@ -29,62 +69,77 @@ def organize_fund_data():
         ORDER BY 产品代码, 净值日期 ASC
     '''
 
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    # 汇总统计直接由 SQLite 计算：每个产品的记录数与最早/最新一条记录
+    # （窗口按净值日期排序，取第一行的产品名称，与按产品代码分组后取首行一致）
+    summary_query = '''
+        SELECT 产品代码, 产品名称, 记录数, 最早日期, 最新日期, 最早单位净值, 最新单位净值
+        FROM (
+            SELECT
+                产品代码,
+                产品名称,
+                ROW_NUMBER() OVER w AS rn,
+                COUNT(*) OVER w_all AS 记录数,
+                净值日期 AS 最早日期,
+                LAST_VALUE(净值日期) OVER w_all AS 最新日期,
+                单位净值 AS 最早单位净值,
+                LAST_VALUE(单位净值) OVER w_all AS 最新单位净值
+            FROM fund_nav_data
+            WINDOW w AS (PARTITION BY 产品代码 ORDER BY 净值日期),
+                   w_all AS (PARTITION BY 产品代码 ORDER BY 净值日期
+                             ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+        )
+        WHERE rn = 1
+        ORDER BY 产品代码
+    '''
 
-    if df.empty:
+    summary_df = pd.read_sql_query(summary_query, conn)
+
+    if summary_df.empty:
+        conn.close()
         print("数据库中没有数据")
         return
 
-    print(f"共读取 {len(df)} 条记录")
+    print(f"共读取 {summary_df['记录数'].sum()} 条记录")
     print("="*100)
 
-    # 获取所有产品代码
-    product_codes = df['产品代码'].unique()
-    print(f"共有 {len(product_codes)} 个不同的产品\n")
+    print(f"共有 {len(summary_df)} 个不同的产品\n")
 
     # 按产品代码分组 - 仅显示摘要
-    for code in product_codes:
-        product_data = df[df['产品代码'] == code]
-        product_name = product_data.iloc[0]['产品名称']
-        print(f"产品代码: {code}, 产品名称: {product_name}, 记录数: {len(product_data)}")
+    for code, product_name, count in zip(summary_df['产品代码'], summary_df['产品名称'], summary_df['记录数']):
+        print(f"产品代码: {code}, 产品名称: {product_name}, 记录数: {count}")
 
     # 生成汇总统计
     print("\n\n数据汇总统计")
     print("="*100)
-
-    summary_data = []
-    for code in product_codes:
-        product_data = df[df['产品代码'] == code]
-        product_name = product_data.iloc[0]['产品名称']
-
-        summary_data.append({
-            '产品代码': code,
-            '产品名称': product_name,
-            '记录数': len(product_data),
-            '最早日期': product_data.iloc[0]['净值日期'],
-            '最新日期': product_data.iloc[-1]['净值日期'],
-            '最早单位净值': product_data.iloc[0]['单位净值'],
-            '最新单位净值': product_data.iloc[-1]['单位净值']
-        })
-
-    summary_df = pd.DataFrame(summary_data)
     print(summary_df.to_string(index=False))
 
     # 保存到Excel文件
     output_file = 'fund_data_organized.xlsx'
     print(f"\n正在保存数据到 {output_file}...")
 
-    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-        # 保存汇总表
-        summary_df.to_excel(writer, sheet_name='汇总', index=False)
+    wb = Workbook(write_only=True)
+
+    # 保存汇总表
+    write_sheet(wb, '汇总', summary_df)
+    used_sheet_names = {'汇总'}
+
+    # 为每个产品创建一个工作表：按产品代码排序分块读取明细并逐块写入，内存中最多只保留一个数据块。
+    # 同一产品的记录连续出现，产品代码变化时新建工作表，否则追加到当前工作表
+    ws = None
+    current_code = None
+    for chunk in pd.read_sql_query(query, conn, chunksize=READ_CHUNK_SIZE):
+        for code, product_data in chunk.groupby('产品代码', sort=False):
+            if ws is not None and code == current_code:
+                append_rows(ws, product_data)
+                continue
+            # Excel工作表名称不能超过31个字符，且不能包含特殊字符；
+            # 截断后重名的产品代码按写入顺序（即产品代码顺序）加序号后缀，不会覆盖或被自动改名
+            sheet_name = unique_sheet_name(str(code), used_sheet_names)
+            ws = write_sheet(wb, sheet_name, product_data)
+            current_code = code
+    conn.close()
 
-        # 为每个产品创建一个工作表
-        for code in product_codes:
-            product_data = df[df['产品代码'] == code]
-            # Excel工作表名称不能超过31个字符，且不能包含特殊字符
-            sheet_name = str(code)[:31]
-            product_data.to_excel(writer, sheet_name=sheet_name, index=False)
+    wb.save(output_file)
 
     print(f"[OK] 数据已保存到 {output_file}")
     print(f"  - 汇总工作表: 包含所有产品的统计信息")
@@ -5,11 +5,21 @@
 自动识别不同格式的Excel文件并提取核心字段
 """
 
+import numpy as np
 import pandas as pd
 import re
 from datetime import datetime
 
 
+# 定义关键字映射（增加更多变体以支持不同格式）
+FIELD_KEYWORDS = {
+    '产品名称': ['产品名称', '基金名称', '资产名称', '名称', 'FundName'],
+    '产品代码': ['产品代码', '基金代码', '资产代码', '代码', '协会备案编码', '协会备案代码', 'FundFillingCode'],
+    '单位净值': ['单位净值', '基金份额净值', '产品单位净值', '当期净值', '资产净值', '净值', '实际净值', 'NAV/Share', 'NAVShare'],
+    '累计单位净值': ['累计单位净值', '基金份额累计净值', '产品累计单位净值', '当期累计净值', '资产净值累计净值', '累计净值', '实际累计净值', 'AccumulatedNAV/Share', 'AccumulatedNAVShare'],
+    '净值日期': ['净值日期', '日期', '估值基准日', 'NAVAsOfDate']
+}
+
 def extract_fund_data_smart(df):
     """
     智能提取基金数据
@@ -29,14 +39,7 @@ def extract_fund_data_smart(df):
         }
     """
 
-    # 定义关键字映射（增加更多变体以支持不同格式）
-    keywords = {
-        '产品名称': ['产品名称', '基金名称', '资产名称', '名称', 'FundName'],
-        '产品代码': ['产品代码', '基金代码', '资产代码', '代码', '协会备案编码', '协会备案代码', 'FundFillingCode'],
-        '单位净值': ['单位净值', '基金份额净值', '产品单位净值', '当期净值', '资产净值', '净值', '实际净值', 'NAV/Share', 'NAVShare'],
-        '累计单位净值': ['累计单位净值', '基金份额累计净值', '产品累计单位净值', '当期累计净值', '资产净值累计净值', '累计净值', '实际累计净值', 'AccumulatedNAV/Share', 'AccumulatedNAVShare'],
-        '净值日期': ['净值日期', '日期', '估值基准日', 'NAVAsOfDate']
-    }
+    keywords = FIELD_KEYWORDS
 
     # 格式1: 尝试作为标准表格（某一行是表头，其后为数据行）
     results = extract_table_format(df, keywords)
@@ -53,75 +56,126 @@ def extract_fund_data_smart(df):
     return None
 
 
-def extract_table_format(df, keywords):
-    """提取表格格式的数据，返回所有数据行的列表"""
-    try:
-        # 检查前几行，找到真正的表头行
-        # 有些Excel前几行是标题/副标题，之后才是表头
-        header_row_idx = None
+def compile_field_patterns(keywords):
+    """将每个字段的全部关键字编译为一个择一匹配的正则表达式，返回 {字段名: 正则}"""
+    return {
+        field_name: re.compile('|'.join(
+            re.escape(variant)
+            for pattern in patterns
+            for variant in dict.fromkeys((pattern, pattern.replace(' ', '')))
+        ))
+        for field_name, patterns in keywords.items()
+    }
+
 
-        for row_idx in range(min(5, len(df))):  # 检查前5行（支持最多4行标题行）
-            row = df.iloc[row_idx].astype(str).values
+def clean_keywords(keywords):
+    """返回 {字段名: [(关键字, 去除空格和换行符后的关键字)]}，保持关键字原有顺序"""
+    return {
+        field_name: [(pattern, pattern.replace(' ', '').replace('\n', '')) for pattern in patterns]
+        for field_name, patterns in keywords.items()
+    }
 
-            # 清理表头中的换行符和空格
-            row_cleaned = [str(cell).replace('\n', '').replace(' ', '') for cell in row]
 
-            # 检查这一行是否包含关键字（可能是表头）
-            # 要求至少匹配2个不同字段的关键字，避免标题行（如"资产净值报告"）被误判为表头
-            matched_field_count = 0
-            for field_name, patterns in keywords.items():
-                for pattern in patterns:
-                    if any(pattern in cell or pattern.replace(' ', '') in cell for cell in row_cleaned):
-                        matched_field_count += 1
-                        break  # 该字段已匹配，检查下一个字段
+# 模块加载时预编译/预处理，避免每次提取都重新计算
+FIELD_PATTERNS = compile_field_patterns(FIELD_KEYWORDS)
+FIELD_KEYWORDS_CLEANED = clean_keywords(FIELD_KEYWORDS)
 
-            if matched_field_count >= 2:
-                header_row_idx = row_idx
-                break
 
-        if header_row_idx is None:
+def extract_table_format(df, keywords):
+    """提取表格格式的数据，返回所有数据行的列表"""
+    try:
+        field_patterns = FIELD_PATTERNS if keywords is FIELD_KEYWORDS else compile_field_patterns(keywords)
+
+        # 检查前几行，找到真正的表头行
+        # 有些Excel前几行是标题/副标题，之后才是表头
+        # 一次性将前5行（支持最多4行标题行）转换为字符串数组，避免逐行 df.iloc[...].astype(str)
+        head_cells = df.head(5).to_numpy(dtype=object).astype(str)
+
+        # 清理表头中的换行符和空格（向量化，逐单元格的字符串操作在 C 层完成）
+        head_cleaned = np.char.replace(np.char.replace(head_cells, '\n', ''), ' ', '')
+
+        # 检查每一行是否包含关键字（可能是表头）：field_hits[k, r] 表示第 k 个字段的关键字出现在第 r 行
+        field_hits = np.array([
+            np.logical_or.reduce([np.char.find(head_cleaned, pattern.replace(' ', '')) >= 0
+                                  for pattern in patterns]).any(axis=1)
+            for patterns in keywords.values()
+        ])
+
+        # 要求至少匹配2个不同字段的关键字，避免标题行（如"资产净值报告"）被误判为表头
+        header_rows = np.flatnonzero(field_hits.sum(axis=0) >= 2)
+        if len(header_rows) == 0:
             return None
+        header_row_idx = int(header_rows[0])
 
         # 检查是否有数据行
         data_row_idx = header_row_idx + 1
         if data_row_idx >= len(df):
             return None
 
-        # 使用找到的表头行作为列名重新读取（清理换行符）
-        cleaned_headers = [str(h).replace('\n', ' ').strip() for h in df.iloc[header_row_idx]]
+        # 使用找到的表头行作为列名（清理换行符）
+        cleaned_headers = [h.replace('\n', ' ').strip() for h in head_cells[header_row_idx]]
 
-        # 从表头行之后的所有行作为数据
-        df_with_header = pd.DataFrame(df.values[data_row_idx:], columns=cleaned_headers)
+        # 从表头行之后的所有行作为数据：直接使用 NumPy 数组切片（对象数组时为视图），
+        # 不再构造带列名的 DataFrame，省去一次整表复制；之后按列位置取值
+        data_values = np.asarray(df.values[data_row_idx:], dtype=object)
 
-        if len(df_with_header) == 0:
+        if len(data_values) == 0:
             return None
 
-        # 遍历所有数据行（支持多行数据表）
-        results = []
-        for row_num in range(len(df_with_header)):
-            data_row = df_with_header.iloc[row_num]
-
-            # 跳过全为空的行
-            if all(pd.isna(v) or str(v).strip() in ('', 'nan', 'NaN') for v in data_row):
+        # 列名与数据行无关：在遍历数据行之前一次清理列名，并为每个字段确定候选列（列位置）。
+        # 候选列按关键字优先级、再按列顺序排列（去重），逐行时取第一个有值的候选列，
+        # 与逐行按关键字×列嵌套查找的结果一致
+        cleaned_columns = [col.replace('\n', '').replace(' ', '') for col in cleaned_headers]
+        field_columns = {}
+        for field_name, patterns in keywords.items():
+            matched = [j for j, col_cleaned in enumerate(cleaned_columns)
+                       if field_patterns[field_name].search(col_cleaned)]
+            candidates = {}
+            for pattern in patterns:
+                for j in matched:
+                    if pattern in cleaned_columns[j] or pattern.replace(' ', '') in cleaned_columns[j]:
+                        candidates.setdefault(j)
+            field_columns[field_name] = list(candidates)
+        # 重名列无法按列名唯一取值，取到这样的列时放弃表格格式
+        duplicated = pd.Index(cleaned_headers).duplicated(keep=False)
+
+        # 一次向量化计算每个单元格的字符串形式、是否为空（跳过全为空的行）以及是否为有效值
+        str_values = data_values.astype(str)
+        stripped = np.char.strip(str_values)
+        missing = pd.isna(data_values)
+        empty_cells = missing | np.isin(stripped, ['', 'nan', 'NaN'])
+        valid_cells = ~missing & (stripped != '') & (str_values != 'nan')
+
+        non_empty_rows = ~empty_cells.all(axis=1)
+        str_values = str_values[non_empty_rows]
+        valid_cells = valid_cells[non_empty_rows]
+        row_count = len(str_values)
+
+        # 按列批量确定每行每个字段的取值：取第一个有效的候选列（argmax 给出首个 True 的位置）
+        field_values = {}
+        for field_name, candidates in field_columns.items():
+            if not candidates:
                 continue
+            candidate_valid = valid_cells[:, candidates]
+            has_value = candidate_valid.any(axis=1)
+            first_valid = candidate_valid.argmax(axis=1)
 
-            result = {}
-
-            # 查找每个字段
-            for field_name, patterns in keywords.items():
-                found = False
-                for pattern in patterns:
-                    for col in df_with_header.columns:
-                        col_cleaned = str(col).replace('\n', '').replace(' ', '')
-                        if pattern in col_cleaned or pattern.replace(' ', '') in col_cleaned:
-                            value = data_row[col]
-                            if pd.notna(value) and str(value).strip() and str(value) != 'nan':
-                                result[field_name] = clean_value(str(value))
-                                found = True
-                                break
-                    if found:
-                        break
+            # 重名列无法按列名唯一取值：某行在找到有效值之前就要读取重名列时，放弃表格格式
+            dup_positions = [t for t, j in enumerate(candidates) if duplicated[j]]
+            if dup_positions and np.any(~has_value | (first_valid >= dup_positions[0])):
+                return None
 
+            chosen = str_values[np.arange(row_count), np.asarray(candidates)[first_valid]]
+            field_values[field_name] = (has_value, chosen)
+
+        # 组装每行的结果（字段顺序与关键字定义一致）
+        results = []
+        for r in range(row_count):
+            result = {
+                field_name: clean_value(str(chosen[r]))
+                for field_name, (has_value, chosen) in field_values.items()
+                if has_value[r]
+            }
             if len(result) >= 3:
                 results.append(result)
 
@@ -136,77 +190,100 @@ def extract_keyvalue_format(df, keywords):
     try:
         result = {}
 
-        # 创建所有关键字的集合，用于验证提取的值不是表头
-        all_keywords = set()
-        for patterns in keywords.values():
-            all_keywords.update(patterns)
-
-        # 遍历所有单元格查找关键字
-        for field_name, patterns in keywords.items():
-            for i in range(len(df)):
-                for j in range(len(df.columns)):
-                    cell_value = str(df.iloc[i, j]).strip()
-
-                    for pattern in patterns:
-                        is_match = False
+        # 所有关键字（预编译），用于验证提取的值不是表头
+        if keywords is FIELD_KEYWORDS:
+            header_keywords = HEADER_KEYWORDS
+        else:
+            header_keywords = compile_header_keywords(
+                pattern for patterns in keywords.values() for pattern in patterns
+            )
+
+        keywords_cleaned = FIELD_KEYWORDS_CLEANED if keywords is FIELD_KEYWORDS else clean_keywords(keywords)
+
+        # 一次性转换为字符串数组（与 str(df.iloc[i, j]) 结果一致），避免逐单元格访问 DataFrame
+        cells = np.char.strip(df.to_numpy(dtype=object).astype(str))
+        cells_cleaned = np.char.replace(np.char.replace(cells, ' ', ''), '\n', '')
+        ncols = cells.shape[1]
+
+        # 多模式命中表：hit_len[k, i, j] 为第 k 个字段的关键字在单元格 (i, j)（清理后）中命中的最长长度，
+        # 0 表示未命中。每个关键字只做一次向量化查找，所有字段的命中情况一次得到。
+        # 表格中大量单元格取值重复（空单元格 'nan'、相同日期等），只对去重后的取值查找，再映射回原位置
+        unique_cleaned, inverse = np.unique(cells_cleaned, return_inverse=True)
+        unique_hit_len = np.zeros((len(keywords), len(unique_cleaned)), dtype=np.int64)
+        for k, patterns in enumerate(keywords_cleaned.values()):
+            for pattern, pattern_cleaned in patterns:
+                hit = np.char.find(unique_cleaned, pattern_cleaned) >= 0
+                np.maximum(unique_hit_len[k], np.where(hit, len(pattern_cleaned), 0), out=unique_hit_len[k])
+        hit_len = unique_hit_len[:, inverse.reshape(cells.shape)]
+
+        # 每个单元格命中的最长与次长关键字长度：某字段之外其他字段的最长命中长度，
+        # 在该字段本身取得最长命中时为次长值，否则为最长值（并列时两者相等）
+        sorted_hit_len = np.sort(hit_len, axis=0)
+        best_hit_len = sorted_hit_len[-1]
+        second_hit_len = sorted_hit_len[-2] if len(sorted_hit_len) > 1 else np.zeros_like(best_hit_len)
+
+        # 模式1（"标签：值"）只需在含全角冒号的单元格上尝试，一次向量化得到掩码
+        has_colon = np.char.find(cells, '：') >= 0
+
+        # 单次遍历：按行优先顺序只走访命中任一字段的单元格，把单元格分派给尚未找到的字段。
+        # 各字段的结果互不影响，每个字段仍取其首个成功匹配的单元格，与逐字段扫描结果一致；
+        # 所有字段都找到后立即结束
+        fields = list(keywords_cleaned.items())
+        for i, j in np.argwhere(best_hit_len > 0):
+            cell_value = cells[i, j]
+            cell_value_cleaned = cells_cleaned[i, j]
+            cell_hit_len = hit_len[:, i, j]
+            cell_best, cell_second = best_hit_len[i, j], second_hit_len[i, j]
+
+            for k, (field_name, patterns) in enumerate(fields):
+                if field_name in result or not cell_hit_len[k]:
+                    continue
+
+                # 其他字段在该单元格中命中的最长关键字长度，用于判断是否存在更精确的字段匹配
+                other_hit_len = cell_second if cell_hit_len[k] == cell_best else cell_best
+
+                for pattern, pattern_cleaned in patterns:
+                    is_match = False
+
+                    # 1. 精确匹配（去除空格和换行符后）
+                    if cell_value_cleaned == pattern_cleaned:
+                        is_match = True
+                    # 2. 包含匹配（但要确保不是子串，例如"名称"不应匹配"客户名称"）
+                    else:
+                        idx = cell_value.find(pattern)
+
+                        # 如果前面是中文字符（如"客户"、"基金"）或字母，则不匹配；
+                        # 中日韩统一表意文字（\u4e00-\u9fff）属于 Unicode 字母类，isalpha() 一次判断即可覆盖
+                        if idx == 0 or (idx > 0 and not cell_value[idx - 1].isalpha()):
+                            is_match = True
 
-                        # 1. 精确匹配（去除空格和换行符后）
-                        cell_value_cleaned = cell_value.replace(' ', '').replace('\n', '')
-                        pattern_cleaned = pattern.replace(' ', '').replace('\n', '')
+                    if is_match:
+                        # 若另一字段有更长（更精确）的模式也匹配此单元格，则跳过
+                        # 例如：'净值日期：'中'净值'匹配单位净值，但'净值日期'更精确地匹配净值日期字段
+                        if other_hit_len > len(pattern_cleaned):
+                            continue  # 跳过此模式，当前单元格更可能属于另一字段
+
+                        # 模式1: "标签：值" 在同一单元格
+                        if has_colon[i, j]:
+                            parts = cell_value.split('：', 1)
+                            if len(parts) == 2:
+                                value = parts[1].strip()
+                                if value and value != 'nan' and not is_header_keyword(value, header_keywords):
+                                    result[field_name] = clean_value(value)
+                                    break
 
-                        if cell_value_cleaned == pattern_cleaned:
-                            is_match = True
-                        # 2. 包含匹配（但要确保不是子串，例如"名称"不应匹配"客户名称"）
-                        elif pattern in cell_value:
-                            idx = cell_value.find(pattern)
-                            before = cell_value[idx-1] if idx > 0 else ''
-
-                            # 如果前面是中文字符（如"客户"、"基金"），则不匹配
-                            if not (before.isalpha() or '\u4e00' <= before <= '\u9fff'):
-                                is_match = True
-
-                        if is_match:
-                            # 若另一字段有更长（更精确）的模式也匹配此单元格，则跳过
-                            # 例如：'净值日期：'中'净值'匹配单位净值，但'净值日期'更精确地匹配净值日期字段
-                            better_field_match = False
-                            for other_field, other_patterns in keywords.items():
-                                if other_field == field_name:
-                                    continue
-                                for other_pattern in other_patterns:
-                                    other_pattern_cleaned = other_pattern.replace(' ', '').replace('\n', '')
-                                    if (other_pattern_cleaned in cell_value_cleaned and
-                                            len(other_pattern_cleaned) > len(pattern_cleaned)):
-                                        better_field_match = True
-                                        break
-                                if better_field_match:
+                        # 模式2: 标签在当前列，值在右侧列
+                        for offset in [1, 2]:
+                            if j + offset < ncols:
+                                value = cells[i, j + offset]
+                                if value and value != 'nan' and value != 'NaN' and not is_header_keyword(value, header_keywords):
+                                    result[field_name] = clean_value(value)
                                     break
-                            if better_field_match:
-                                continue  # 跳过此模式，当前单元格更可能属于另一字段
-
-                            # 模式1: "标签：值" 在同一单元格
-                            if '：' in cell_value:
-                                parts = cell_value.split('：', 1)
-                                if len(parts) == 2:
-                                    value = parts[1].strip()
-                                    if value and value != 'nan' and not is_header_keyword(value, all_keywords):
-                                        result[field_name] = clean_value(value)
-                                        break
-
-                            # 模式2: 标签在当前列，值在右侧列
-                            for offset in [1, 2]:
-                                if j + offset < len(df.columns):
-                                    value = str(df.iloc[i, j + offset]).strip()
-                                    if value and value != 'nan' and value != 'NaN' and not is_header_keyword(value, all_keywords):
-                                        result[field_name] = clean_value(value)
-                                        break
-
-                            break
-
-                    if field_name in result:
+
                         break
 
-                if field_name in result:
-                    break
+            if len(result) == len(fields):
+                break
 
         return result if len(result) >= 3 else None
 
@@ -214,41 +291,58 @@ def extract_keyvalue_format(df, keywords):
         return None
 
 
-def is_header_keyword(value, keywords):
-    """检查值是否是表头关键字"""
-    value_lower = value.lower().strip()
+# 常见的表头关键字列表
+HEADER_PATTERNS = [
+    '产品名称', '基金名称', '名称',
+    '产品代码', '基金代码', '代码',
+    '单位净值', '基金份额净值', '产品单位净值', '净值',
+    '累计单位净值', '基金份额累计净值', '产品累计单位净值', '累计净值',
+    '净值日期', '日期',
+    '客户名称', '份额', '参与计提份额',
+    '计提频率', '业绩报酬', '提取净值', '虚拟净值'
+]
+
 
-    # 常见的表头关键字列表
-    header_patterns = [
-        '产品名称', '基金名称', '名称',
-        '产品代码', '基金代码', '代码',
-        '单位净值', '基金份额净值', '产品单位净值', '净值',
-        '累计单位净值', '基金份额累计净值', '产品累计单位净值', '累计净值',
-        '净值日期', '日期',
-        '客户名称', '份额', '参与计提份额',
-        '计提频率', '业绩报酬', '提取净值', '虚拟净值'
-    ]
+def compile_header_keywords(keywords):
+    """将常见表头关键字与给定的字段关键字合并并预编译，供 is_header_keyword 使用
+
+    返回 (关键字集合, 匹配任一关键字的正则, 以 \\x00 分隔的关键字拼接串)
+    """
+    all_headers = frozenset(HEADER_PATTERNS) | frozenset(keywords)
+    return (
+        all_headers,
+        re.compile('|'.join(re.escape(keyword) for keyword in sorted(all_headers))),
+        '\x00'.join(all_headers)
+    )
 
-    for keyword in header_patterns:
-        if keyword in value or value in keyword:
-            return True
 
-    for keyword in keywords:
-        if keyword in value or value in keyword:
-            return True
+# 模块加载时预编译（字段关键字取自 FIELD_KEYWORDS）
+HEADER_KEYWORDS = compile_header_keywords(
+    pattern for patterns in FIELD_KEYWORDS.values() for pattern in patterns
+)
 
-    return False
+
+def is_header_keyword(value, header_keywords=HEADER_KEYWORDS):
+    """检查值是否是表头关键字：值包含某个关键字，或值本身是某个关键字的一部分
+
+    header_keywords 为 compile_header_keywords 的返回值
+    """
+    exact, contains_re, joined = header_keywords
+
+    # 精确命中最常见，一次集合查找即可
+    if value in exact or contains_re.search(value):
+        return True
+
+    # 值是某个关键字的子串：在拼接串中查找一次（值不含分隔符时与逐个关键字判断等价）
+    return '\x00' not in value and value in joined
 
 
 def clean_value(value):
     """清理提取的值"""
-    value = str(value).strip()
-
-    # 移除下划线后的内容（如 "SLA149_总层面" -> "SLA149"）
-    if '_' in value:
-        value = value.split('_')[0]
+    value = value.strip() if isinstance(value, str) else str(value).strip()
 
-    return value
+    # 移除下划线后的内容（如 "SLA149_总层面" -> "SLA149"）；没有下划线时 partition 返回原值
+    return value.partition('_')[0]
 
 
 def is_valid_result(result):
@@ -265,6 +359,23 @@ def is_valid_result(result):
     return True
 
 
+# 支持的日期格式
+DATE_FORMATS = [
+    '%Y%m%d',               # 20240130
+    '%Y-%m-%d',             # 2024-01-30
+    '%Y/%m/%d',             # 2024/01/30
+    '%Y-%m-%d %H:%M:%S',   # 2024-01-30 00:00:00 (pandas Timestamp字符串)
+]
+
+# 常见日期形态（长度, 第5个字符为分隔符时的分隔符）-> 对应格式
+DATE_FORMAT_DISPATCH = {
+    (8, ''): '%Y%m%d',
+    (10, '-'): '%Y-%m-%d',
+    (10, '/'): '%Y/%m/%d',
+    (19, '-'): '%Y-%m-%d %H:%M:%S',
+}
+
+
 def normalize_date(date_str):
     """标准化日期格式为 YYYYMMDD"""
     if not date_str:
@@ -272,15 +383,17 @@ def normalize_date(date_str):
 
     date_str = str(date_str).strip()
 
-    # 尝试不同的日期格式
-    formats = [
-        '%Y%m%d',               # 20240130
-        '%Y-%m-%d',             # 2024-01-30
-        '%Y/%m/%d',             # 2024/01/30
-        '%Y-%m-%d %H:%M:%S',   # 2024-01-30 00:00:00 (pandas Timestamp字符串)
-    ]
+    # 先按字符串形态直接选出对应格式，常见情况只需解析一次，不会逐个格式尝试并抛出异常
+    separator = date_str[4:5]
+    fmt = DATE_FORMAT_DISPATCH.get((len(date_str), '' if separator.isdigit() else separator))
+    if fmt is not None:
+        try:
+            return datetime.strptime(date_str, fmt).strftime('%Y%m%d')
+        except ValueError:
+            pass
 
-    for fmt in formats:
+    # 其他形态：依次尝试不同的日期格式
+    for fmt in DATE_FORMATS:
         try:
             dt = datetime.strptime(date_str, fmt)
             return dt.strftime('%Y%m%d')
@@ -326,6 +439,13 @@ def extract_and_normalize(df):
     if not data_list:
         return None
 
+    # 同一表格中各行的净值日期大多相同，每个不同的日期只标准化一次
+    normalized_dates = {}
+    for data in data_list:
+        date_str = data.get('净值日期')
+        if date_str not in normalized_dates:
+            normalized_dates[date_str] = normalize_date(date_str)
+
     normalized_list = []
     for data in data_list:
         normalized = {
@@ -333,7 +453,7 @@ def extract_and_normalize(df):
             '产品代码': data.get('产品代码'),
             '客户名称': data.get('客户名称'),
             '参与计提份额': convert_to_float(data.get('参与计提份额')) if data.get('参与计提份额') else None,
-            '净值日期': normalize_date(data.get('净值日期')),
+            '净值日期': normalized_dates[data.get('净值日期')],
             '单位净值': convert_to_float(data.get('单位净值')),
             '累计单位净值': convert_to_float(data.get('累计单位净值')) if data.get('累计单位净值') else None,
             '计提频率': data.get('计提频率'),
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台拉取线程的回归测试：拉取出错时异常需传回调用方，而不是被当作正常结束而静默截断；
+调用方提前退出时后台线程需停止并退出，之后不再发出 IMAP 命令
+"""
+
+import imaplib
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import get_163_email  # noqa: E402
+
+
+def uid_list(count):
+    return [str(uid).encode() for uid in range(1, count + 1)]
+
+
+class FetchEmailsInBatchesTest(unittest.TestCase):
+
+    def test_producer_error_is_raised_in_consumer(self):
+        def fetch_email_batch(imap_client, batch):
+            if batch[0] != b'1':
+                raise imaplib.IMAP4.abort('socket error')
+            return [(uid, b'raw') for uid in batch]
+
+        with mock.patch.object(get_163_email, 'fetch_email_batch', fetch_email_batch):
+            fetched = get_163_email.fetch_emails_in_batches(None, uid_list(5), batch_size=2)
+            self.assertEqual(next(fetched)[0], b'1')
+            self.assertEqual(next(fetched)[0], b'2')
+            with self.assertRaises(imaplib.IMAP4.abort):
+                next(fetched)
+
+    def test_close_stops_producer(self):
+        batches = []
+
+        def fetch_email_batch(imap_client, batch):
+            batches.append(batch)
+            return [(uid, b'raw') for uid in batch]
+
+        threads_before = threading.active_count()
+        with mock.patch.object(get_163_email, 'fetch_email_batch', fetch_email_batch):
+            fetched = get_163_email.fetch_emails_in_batches(
+                None, uid_list(1000), batch_size=10, prefetch_messages=5)
+            self.assertEqual(next(fetched)[0], b'1')
+            fetched.close()
+            fetched_batches = len(batches)
+
+        # close() 返回时后台线程已退出，不再拉取后续批次
+        self.assertEqual(threading.active_count(), threads_before)
+        self.assertEqual(len(batches), fetched_batches)
+        self.assertLess(fetched_batches, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
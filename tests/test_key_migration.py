@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+唯一键格式迁移的回归测试：旧版本以 '123456.0'、'20240130.0' 形式入库的产品代码/净值日期，
+需改写为新格式并与同一条数据的新格式记录合并，避免同一基金出现两个 fund_id、净值重复入库
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import get_163_email  # noqa: E402
+
+
+class KeyMigrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'fund_data.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def init_database(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return get_163_email.init_database(self.db_path)
+
+    def test_float_keys_are_migrated_and_merged(self):
+        # 构造旧版本数据库：同一基金分别以新旧两种格式入库
+        conn = self.init_database()
+        conn.execute("DELETE FROM sync_state WHERE key = 'key_format'")
+        conn.executescript('''
+            INSERT INTO funds (产品代码, 产品名称) VALUES ('123456', '东恺'), ('123456.0', '东恺'), ('654321.0', '西恺');
+            INSERT INTO fund_nav_data (fund_id, 产品名称, 产品代码, 净值日期, 单位净值, 累计单位净值) VALUES
+                (1, '东恺', '123456', '20240130', 1.2, NULL),
+                (2, '东恺', '123456.0', '20240130.0', 1.2, 1.5),
+                (2, '东恺', '123456.0', '20240131.0', 1.3, NULL),
+                (3, '西恺', '654321.0', '20240130.0', 0.9, NULL);
+        ''')
+        conn.commit()
+        conn.close()
+
+        conn = self.init_database()
+        self.assertEqual(
+            conn.execute('SELECT fund_id, 产品代码 FROM funds ORDER BY fund_id').fetchall(),
+            [(1, '123456'), (3, '654321')])
+        self.assertEqual(
+            conn.execute('SELECT fund_id, 产品代码, 净值日期, 累计单位净值 FROM fund_nav_data ORDER BY id').fetchall(),
+            [(1, '123456', '20240130', 1.5), (1, '123456', '20240131', None), (3, '654321', '20240130', None)])
+
+        # 迁移后按新格式写入的同一条数据视为重复
+        failed_inserts = []
+        inserted, skipped = get_163_email.insert_data_to_db(conn, pd.DataFrame([{
+            '产品名称': '西恺', '产品代码': '654321.0', '净值日期': '20240130.0', '单位净值': 0.9,
+        }]), failed_inserts)
+        self.assertEqual((inserted, skipped), (0, 1))
+        conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+附件落盘的回归测试：base64 载荷分块解码的结果须与 get_payload(decode=True) 一致，
+数据不规范时回退到 get_payload(decode=True)
+"""
+
+import hashlib
+import os
+import sys
+import unittest
+from email import encoders
+from email.mime.base import MIMEBase
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import get_163_email  # noqa: E402
+
+
+def build_part(data):
+    part = MIMEBase('application', 'octet-stream')
+    part.set_payload(data)
+    encoders.encode_base64(part)
+    return part
+
+
+class SpoolAttachmentTest(unittest.TestCase):
+
+    def assertSpooled(self, part):
+        expected = part.get_payload(decode=True)
+        spool, digest = get_163_email.spool_attachment(part)
+        with spool:
+            self.assertEqual(spool.read(), expected)
+        self.assertEqual(digest, hashlib.sha1(expected).digest())
+
+    def test_base64_payload_spanning_several_chunks(self):
+        # 带换行的 base64 载荷跨越多个解码块，且块边界不与 4 字符对齐
+        self.assertSpooled(build_part(os.urandom(get_163_email.BASE64_DECODE_CHUNK_SIZE * 2 + 7)))
+
+    def test_malformed_base64_falls_back(self):
+        part = build_part(b'excel data')
+        part.set_payload(part.get_payload().rstrip('=\n') + '!')
+        self.assertSpooled(part)
+
+
+if __name__ == '__main__':
+    unittest.main()
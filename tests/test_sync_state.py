@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量同步位点的回归测试：本次同步有邮件未能处理时，不能记录 HIGHESTMODSEQ，
+否则下次同步会因邮箱未变化而跳过 UID SEARCH，这些邮件再也不会被重试
+"""
+
+import contextlib
+import imaplib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import get_163_email  # noqa: E402
+
+
+def build_email(uid):
+    """构造一封带标准净值表 Excel 附件的邮件"""
+    buffer = io.BytesIO()
+    pd.DataFrame([
+        ['产品名称', '产品代码', '净值日期', '单位净值'],
+        [f'测试基金{uid}', f'T{uid:04d}', '20240130', 1.0 + uid / 1000],
+    ]).to_excel(buffer, header=False, index=False)
+
+    msg = MIMEMultipart()
+    msg.attach(MIMEText('净值', 'plain', 'utf-8'))
+    part = MIMEBase('application', 'vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    part.set_payload(buffer.getvalue())
+    encoders.encode_base64(part)
+    part.add_header('Content-Disposition', 'attachment', filename=f'f{uid}.xlsx')
+    msg.attach(part)
+    msg['Subject'] = f'净值{uid}'
+    msg['From'] = 'nav@example.com'
+    msg['Date'] = 'Tue, 30 Jan 2024 10:00:00 +0800'
+    return msg.as_bytes()
+
+
+class FakeIMAP:
+    """支持 CONDSTORE 的最小 IMAP 服务器替身；fail_uids 中的邮件拉取时不返回内容"""
+
+    messages = {}
+    fail_uids = set()
+    highestmodseq = b'1000'
+    searches = []
+    capabilities = ('IMAP4REV1', 'ID', 'ENABLE', 'CONDSTORE')
+
+    def __init__(self, host, port):
+        self.untagged_responses = {}
+
+    def login(self, user, password):
+        return 'OK', [b'ok']
+
+    def _simple_command(self, name, *args):
+        return 'OK', [b'ok']
+
+    def enable(self, capability):
+        return 'OK', [b'ok']
+
+    def select(self, mailbox):
+        self.untagged_responses['UIDVALIDITY'] = [b'7']
+        self.untagged_responses['HIGHESTMODSEQ'] = [self.highestmodseq]
+        return 'OK', [str(len(self.messages)).encode()]
+
+    def _uid_set(self, uid_set):
+        uids = []
+        for part in uid_set.decode().split(','):
+            start, _, end = part.partition(':')
+            uids.extend(range(int(start), int(end or start) + 1))
+        return uids
+
+    def uid(self, command, *args):
+        if command == 'search':
+            FakeIMAP.searches.append(args[-1])
+            criteria = args[-1]
+            first = 1 if criteria == 'ALL' else int(criteria.split()[1].split(':')[0])
+            uids = [uid for uid in sorted(self.messages) if uid >= first]
+            return 'OK', [b' '.join(str(uid).encode() for uid in uids)]
+        uid_set, items = args
+        if 'BODYSTRUCTURE' in items:
+            return 'NO', [b'BODYSTRUCTURE not supported']
+        data = []
+        for uid in self._uid_set(uid_set):
+            if uid in self.messages and uid not in self.fail_uids:
+                raw = self.messages[uid]
+                data.append((f'{uid} (UID {uid} BODY[] {{{len(raw)}}}'.encode(), raw))
+                data.append(b')')
+        return 'OK', data
+
+    def close(self):
+        return 'OK', []
+
+    def logout(self):
+        return 'BYE', []
+
+
+class SyncStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'fund_data.db')
+        self.saved_imap = imaplib.IMAP4_SSL
+        imaplib.IMAP4_SSL = FakeIMAP
+        os.environ['PARSE_WORKERS'] = '1'
+        FakeIMAP.messages = {uid: build_email(uid) for uid in (101, 102, 103)}
+        FakeIMAP.fail_uids = set()
+        FakeIMAP.searches = []
+
+    def tearDown(self):
+        imaplib.IMAP4_SSL = self.saved_imap
+        os.environ.pop('PARSE_WORKERS', None)
+        self.tmpdir.cleanup()
+
+    def sync(self):
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            get_163_email.connect_and_fetch_email('user@163.com', 'password', self.db_path)
+
+    def query(self, sql):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute(sql).fetchall()
+        finally:
+            conn.close()
+
+    def test_failed_last_uid_is_retried_when_mailbox_unchanged(self):
+        # 第一次同步：最后一封邮件拉取失败
+        FakeIMAP.fail_uids = {103}
+        self.sync()
+        state = dict(self.query('SELECT key, value FROM sync_state'))
+        self.assertEqual(state['last_uid'], '102')
+        self.assertNotIn('highestmodseq', state)
+
+        # 第二次同步：服务器恢复正常、邮箱没有变化，仍需搜索并补上失败的邮件
+        FakeIMAP.fail_uids = set()
+        FakeIMAP.searches = []
+        self.sync()
+        self.assertEqual(FakeIMAP.searches, ['UID 103:*'])
+        self.assertEqual(self.query("SELECT COUNT(*) FROM fund_nav_data WHERE 产品代码 = 'T0103'"), [(1,)])
+        state = dict(self.query('SELECT key, value FROM sync_state'))
+        self.assertEqual(state['last_uid'], '103')
+        self.assertEqual(state['highestmodseq'], '1000')
+
+        # 第三次同步：已全部处理且邮箱未变化，跳过搜索
+        FakeIMAP.searches = []
+        self.sync()
+        self.assertEqual(FakeIMAP.searches, [])
+
+    def test_sync_with_multiple_parse_workers(self):
+        # 多个解析子进程（不以 fork 方式创建）与后台拉取线程同时工作
+        os.environ['PARSE_WORKERS'] = '2'
+        FakeIMAP.messages = {uid: build_email(uid) for uid in range(101, 111)}
+        self.sync()
+        self.assertEqual(
+            self.query('SELECT 产品代码 FROM fund_nav_data ORDER BY id'),
+            [(f'T{uid:04d}',) for uid in range(101, 111)])
+        state = dict(self.query('SELECT key, value FROM sync_state'))
+        self.assertEqual(state['last_uid'], '110')
+        self.assertEqual(state['highestmodseq'], '1000')
+
+
+if __name__ == '__main__':
+    unittest.main()